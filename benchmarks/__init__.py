@@ -0,0 +1 @@
+"""Offline benchmarks of the run loop against a mocked upstream."""
@@ -0,0 +1,207 @@
+"""
+Offline benchmark of the account run loop against MockUpstream.
+
+    python -m benchmarks.bench --accounts 1000 --latency 0.05 --error-rate 0.01
+
+Runs main.py's check-in pass (mhyy.checkin.check_in) over synthetic accounts
+with the production defaults, only the files redirected to a scratch
+directory, and reports accounts per second, p50/p99 per-account latency and
+peak memory. MockUpstream answers in process, so sockets and TLS are not part
+of the numbers. With ``--replay`` the responses come from a cassette recorded
+by ``main.py --record`` instead.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from mhyy.cassette import Cassette
+from mhyy.checkin import Session, check_in
+from mhyy.metrics import Metrics
+from mhyy.runner import RunnerLimits
+
+from .mock_api import MockSettings, MockUpstream
+
+# Every channel configured, so each push fans out to all four webhooks
+NOTIFICATIONS = {
+    "serverchan": {"key": "bench"},
+    "dingtalk": {"webhook_url": "https://oapi.dingtalk.com/robot/send?access_token=bench"},
+    "pushplus": {"key": "bench"},
+    "telegram": {"bot_token": "bench", "chat_id": "1"},
+}
+
+
+def synthetic_accounts(count: int) -> list:
+    return [
+        {
+            "token": f"oi={index};ltoken=bench{index}",
+            "type": 2,
+            "sysver": "14",
+            "deviceid": f"bench-{index:05d}",
+            "devicename": "bench",
+            "devicemodel": "bench",
+            "appid": 1953439974,
+            "region": "os" if index % 2 else "cn",
+        }
+        for index in range(1, count + 1)
+    ]
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile, ``q`` in 0..100."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil without floats
+    return ordered[int(rank) - 1]
+
+
+def bench_config(args, workdir: str) -> dict:
+    """A main.py config with default settings, files kept in ``workdir``."""
+    config = {
+        "accounts": synthetic_accounts(args.accounts),
+        "notifications": dict(NOTIFICATIONS, mode=args.notify) if args.notify != "none" else {},
+        "runner": {"concurrency": args.concurrency, "per_host": args.per_host},
+        "resilience": {"backoff": args.backoff},
+        "version_cache": {"path": os.path.join(workdir, "version.json"), "ttl": 0, "max_stale": 0},
+        "state": {"enabled": args.state, "path": os.path.join(workdir, "state.db")},
+        "outbox": {"path": os.path.join(workdir, "outbox.db")},
+        "results": {"path": os.path.join(workdir, "results.jsonl")},
+        "ratelimit": {},
+    }
+    if args.rate is not None:
+        config["ratelimit"]["rate"] = args.rate
+    if args.spread is not None:
+        config["ratelimit"]["spread"] = args.spread
+    return config
+
+
+async def run_once(args, transport, workdir: str) -> dict:
+    # The options check_in reads from main.py's command line
+    options = argparse.Namespace(incremental=None, results=None, accounts_from=None, shard_output=None)
+    session = Session(bench_config(args, workdir), options, Metrics(), transport=transport)
+
+    started = time.perf_counter()
+    try:
+        processed = await check_in(session)
+    finally:
+        await session.aclose()
+    elapsed = time.perf_counter() - started
+
+    with open(os.path.join(workdir, "results.jsonl"), encoding="utf-8") as f:
+        latencies = [json.loads(line)["elapsed"] for line in f]
+    return {
+        "accounts": processed,
+        "seconds": round(elapsed, 3),
+        "accounts_per_second": round(processed / elapsed, 2) if elapsed else None,
+        "p50": round(percentile(latencies, 50), 4),
+        "p99": round(percentile(latencies, 99), 4),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the MHYY run loop")
+    parser.add_argument("--accounts", type=int, default=100, help="synthetic accounts (1-10000)")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean mock response time, seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency varies by +/- this fraction")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 responses")
+    parser.add_argument("--payload", type=int, default=0, help="bytes of padding per API response")
+    parser.add_argument("--expired-rate", type=float, default=0.0, help="share of expired accounts")
+    parser.add_argument("--concurrency", type=int, default=RunnerLimits.concurrency)
+    parser.add_argument("--per-host", type=int, default=RunnerLimits.per_host)
+    parser.add_argument(
+        "--rate", type=float, help="requests/s per host, 0 disables pacing (default: ratelimit default)"
+    )
+    parser.add_argument(
+        "--spread", type=float, help="seconds account starts are spread over (default: ratelimit default)"
+    )
+    parser.add_argument("--backoff", type=float, default=0.05, help="retry backoff base, seconds")
+    parser.add_argument(
+        "--notify", choices=("per_account", "digest", "none"), default="per_account"
+    )
+    parser.add_argument("--no-state", dest="state", action="store_false", help="skip the SQLite state store")
+    parser.add_argument(
+        "--no-tracemalloc",
+        dest="tracemalloc",
+        action="store_false",
+        help="measure throughput without tracemalloc overhead (peak memory from ru_maxrss only)",
+    )
+    parser.add_argument("--replay", metavar="FILE", help="serve responses from a recorded cassette")
+    parser.add_argument(
+        "--replay-latency", type=float, default=1.0, help="scale of the recorded latencies when replaying"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log", action="store_true", help="show the run's log output")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    if not 1 <= args.accounts <= 10000:
+        parser.error("--accounts must be between 1 and 10000")
+    return args
+
+
+def max_rss_mib():
+    try:
+        import resource
+    except ImportError:  # not on Windows
+        return None
+    # Linux reports KiB, macOS bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if os.uname().sysname == "Darwin" else 1024), 1)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Log records are still built and formatted, as in a real run, just not shown
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s]: %(message)s",
+        stream=None if args.log else open(os.devnull, "w"),
+    )
+
+    if args.replay:
+        transport = Cassette.load(args.replay, args.replay_latency).transport()
+    else:
+        transport = MockUpstream(
+            MockSettings(
+                latency=args.latency,
+                jitter=args.jitter,
+                error_rate=args.error_rate,
+                payload=args.payload,
+                expired_rate=args.expired_rate,
+            ),
+            seed=args.seed,
+        )
+    if args.tracemalloc:
+        tracemalloc.start()
+    with tempfile.TemporaryDirectory(prefix="mhyy-bench-") as workdir:
+        report = asyncio.run(run_once(args, transport, workdir))
+    if args.tracemalloc:
+        report["peak_traced_mib"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        tracemalloc.stop()
+    report["max_rss_mib"] = max_rss_mib()
+    report["requests"] = dict(getattr(transport, "requests", {}))
+    report["injected_errors"] = dict(getattr(transport, "errors", {}))
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    print(f"accounts           {report['accounts']}")
+    print(f"wall time          {report['seconds']:.3f} s")
+    print(f"throughput         {report['accounts_per_second']} accounts/s")
+    print(f"latency p50 / p99  {report['p50']:.4f} / {report['p99']:.4f} s")
+    if "peak_traced_mib" in report:
+        print(f"peak memory        {report['peak_traced_mib']} MiB (tracemalloc)")
+    print(f"max RSS            {report['max_rss_mib']} MiB")
+    if report["requests"]:
+        print("requests           " + " ".join(f"{k}={v}" for k, v in sorted(report["requests"].items())))
+    if report["injected_errors"]:
+        print("injected errors    " + " ".join(f"{k}={v}" for k, v in sorted(report["injected_errors"].items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+import httpx
+
+
+@dataclass
+class MockSettings:
+    """Behaviour of the stand-in upstreams."""
+
+    latency: float = 0.05  # mean seconds per response
+    jitter: float = 0.5  # latency varies by +/- this fraction
+    error_rate: float = 0.0  # share of responses answered with 503
+    payload: int = 0  # bytes of padding added to the cloud-game API responses
+    expired_rate: float = 0.0  # share of accounts whose wallet answers retcode -100
+
+
+# (host fragment, path fragment) -> route name; the first match wins
+ROUTES = (
+    ("hyp-api.mihoyo.com", "getGameBranches", "version"),
+    ("", "/wallet/wallet/get", "wallet"),
+    ("", "getAnnouncementInfo", "announcement"),
+    ("", "listNotifications", "notification"),
+    ("sctapi.ftqq.com", "", "serverchan"),
+    ("oapi.dingtalk.com", "", "dingtalk"),
+    ("www.pushplus.plus", "", "pushplus"),
+    ("api.telegram.org", "", "telegram"),
+)
+
+
+def route_of(request: httpx.Request) -> str:
+    host, path = request.url.host, request.url.path
+    for host_part, path_part, name in ROUTES:
+        if host_part in host and path_part in path:
+            return name
+    return "unknown"
+
+
+def is_expired(token: str, rate: float) -> bool:
+    """Decides per token (not per request) so an account is consistently expired."""
+    return rate > 0 and random.Random(token).random() < rate
+
+
+class MockUpstream(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Transport answering every upstream main.py talks to: getGameBranches, the
+    cloud-game wallet / announcement / notification APIs and the ServerChan,
+    DingTalk, PushPlus and Telegram webhooks. Pass it to ClientRegistry; the
+    sync side serves the version prefetch thread.
+    """
+
+    def __init__(self, settings: MockSettings = None, seed: int = 0):
+        self.settings = settings or MockSettings()
+        self.requests = Counter()
+        self.errors = Counter()
+        self._random = random.Random(seed)
+        padding = "x" * self.settings.payload
+        self._padding = {"padding": padding} if padding else {}
+
+    def _json(self, data: dict) -> httpx.Response:
+        return httpx.Response(
+            200,
+            content=json.dumps(data, ensure_ascii=False).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+
+    def _answer(self, route: str, request: httpx.Request) -> httpx.Response:
+        if route == "version":
+            return self._json({"retcode": 0, "data": {"game_branches": [{"main": {"tag": "5.9.0"}}]}})
+        if route == "wallet":
+            token = request.headers.get("x-rpc-combo_token", "")
+            if is_expired(token, self.settings.expired_rate):
+                return self._json({"retcode": -100, "message": "登录已失效，请重新登录", "data": None})
+            return self._json(
+                {
+                    "retcode": 0,
+                    "message": "OK",
+                    "data": {
+                        "free_time": {"free_time": "600"},
+                        "play_card": {"short_msg": "未开通"},
+                        "coin": {"coin_num": "120"},
+                        **self._padding,
+                    },
+                }
+            )
+        if route == "announcement":
+            return self._json({"retcode": 0, "message": "OK", "data": dict(self._padding)})
+        if route == "notification":
+            reward = json.dumps({"num": 15, "over_num": 0, "msg": "每日登录奖励"}, ensure_ascii=False)
+            return self._json(
+                {"retcode": 0, "message": "OK", "data": {"list": [{"msg": reward}], **self._padding}}
+            )
+        if route == "dingtalk":
+            return self._json({"errcode": 0, "errmsg": "ok"})
+        if route == "telegram":
+            return self._json({"ok": True, "result": {}})
+        return httpx.Response(200, text="ok")
+
+    def _delay(self) -> float:
+        settings = self.settings
+        if settings.latency <= 0:
+            return 0.0
+        spread = settings.latency * settings.jitter
+        return max(0.0, self._random.uniform(settings.latency - spread, settings.latency + spread))
+
+    def _respond(self, route: str, request: httpx.Request) -> httpx.Response:
+        if self.settings.error_rate > 0 and self._random.random() < self.settings.error_rate:
+            self.errors[route] += 1
+            return httpx.Response(503, text="mock upstream error")
+        return self._answer(route, request)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        route = route_of(request)
+        self.requests[route] += 1
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._respond(route, request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        route = route_of(request)
+        self.requests[route] += 1
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._respond(route, request)
@@ -1,28 +1,36 @@
-import httpx
-import json
+import argparse
+import asyncio
 import os
-import re
-import sentry_sdk
-import random
+import sys
+import threading
 import time
 import yaml
 import logging
 
+# Startup phases are reported relative to this point (see PhaseTimer)
+STARTED = time.perf_counter()
+
+# --profile / MHYY_PROFILE: started before anything else so that imports, the
+# config and Sentry are covered; without it nothing below is instrumented
+from mhyy.profiling import DEFAULT_DIRECTORY, Profiler, requested_directory
+
+PROFILE_DIRECTORY = requested_directory(sys.argv[1:], os.environ)
+PROFILER = Profiler(PROFILE_DIRECTORY).start() if PROFILE_DIRECTORY else None
+
+from mhyy.cassette import open_cassette
+from mhyy.checkin import RunError, Session, check_in, make_registry
+from mhyy.daemon import ConfigWatcher, DaemonSettings, run_daemon
+from mhyy.logs import LogSettings, flush_logging, setup_logging
+from mhyy.metrics import Metrics, MetricsSettings, PhaseTimer, serve, write_textfile
+from mhyy.notify import Dispatcher
+from mhyy.sentry import init_sentry
+from mhyy.shard import merge_shard_results, parse_shard
+from mhyy.sources import SafeLoader
+
 # --- Logging Setup ---
-if os.environ.get("MHYY_LOGLEVEL", "").upper() == "DEBUG":
-    loglevel = logging.DEBUG
-elif os.environ.get("MHYY_LOGLEVEL", "").upper() == "WARNING":
-    loglevel = logging.WARNING
-elif os.environ.get("MHYY_LOGLEVEL", "").upper() == "ERROR":
-    loglevel = logging.ERROR
-else:
-    loglevel = logging.INFO
-
-logging.basicConfig(
-    level=loglevel,
-    format="%(asctime)s [%(levelname)s]: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+# Records go through a queue to a writer thread (MHYY_LOGLEVEL, MHYY_LOG_FORMAT=json,
+# MHYY_LOG_BUFFER=1 to keep each account's lines together; see mhyy.logs)
+setup_logging(LogSettings.from_env(os.environ))
 
 logger = logging.getLogger()
 
@@ -38,7 +46,7 @@ def ReadConf(variable_name, default_value=None):
     if env_value:
         try:
             # Attempt to load from environment variable (assuming it's YAML)
-            config_data = yaml.load(env_value, Loader=yaml.FullLoader)
+            config_data = yaml.load(env_value, Loader=SafeLoader)
             logger.debug("Configuration loaded from environment variable.")
             return config_data
         except yaml.YAMLError as e:
@@ -55,7 +63,7 @@ def ReadConf(variable_name, default_value=None):
     # If not found or failed in environment, try to read from config.yml
     try:
         with open("config.yml", "r", encoding="utf-8") as config_file:
-            config_data = yaml.load(config_file, Loader=yaml.FullLoader)
+            config_data = yaml.load(config_file, Loader=SafeLoader)
             logger.debug("Configuration loaded from config.yml file.")
             return config_data
     except FileNotFoundError:
@@ -70,14 +78,21 @@ def ReadConf(variable_name, default_value=None):
 
 
 # --- Sentry Setup ---
-sentry_sdk.init(
-    "https://425d7b4536f94c9fa540fe34dd6609a2@o361988.ingest.sentry.io/6352584",
-    traces_sample_rate=1.0,
-)
+# Errors only; tracing is opt-in via MHYY_SENTRY_TRACES_SAMPLE_RATE, timings go to mhyy.metrics.
+# Importing sentry_sdk is slow, so it happens on a thread while the config is parsed
+threading.Thread(
+    target=init_sentry if PROFILER is None else PROFILER.timed("sentry", init_sentry),
+    name="mhyy-sentry",
+    daemon=True,
+).start()
 
 # --- Load Configuration ---
+IMPORTED = time.perf_counter()
 full_config = ReadConf("MHYY_CONFIG", {})  # Read the entire config
-accounts_conf = full_config.get("accounts")
+CONFIG_LOADED = time.perf_counter()
+if PROFILER is not None:
+    PROFILER.add("imports", IMPORTED - STARTED)
+    PROFILER.add("config", CONFIG_LOADED - IMPORTED)
 notification_settings = full_config.get(
     "notifications", {}
 )  # Get notification settings, default to empty dict
@@ -86,378 +101,207 @@ proxy_settings = full_config.get("proxy")
 if proxy_settings:
     logger.info(f"检测到代理设置: {proxy_settings}")
 
-if not accounts_conf:
-    logger.error(
-        "请正确配置环境变量 MHYY_CONFIG 或者 config.yml 并包含 'accounts' 部分后再运行本脚本！"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MHYY-AutoCheckin")
+    parser.add_argument(
+        "--shard",
+        default=os.environ.get("MHYY_SHARD"),
+        help="只处理第 N/M 个分片的账号，例如 3/8（也可用环境变量 MHYY_SHARD）",
+    )
+    parser.add_argument(
+        "--shard-output",
+        default=os.environ.get("MHYY_SHARD_OUTPUT"),
+        help="把本分片的结果写入该文件供 --merge 汇总，本分片不再单独推送（也可用环境变量 MHYY_SHARD_OUTPUT）",
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="+",
+        metavar="FILE",
+        help="合并各分片的结果文件（支持通配符），以汇总消息推送后退出",
+    )
+    parser.add_argument(
+        "--accounts-from",
+        default=os.environ.get("MHYY_ACCOUNTS_FROM"),
+        metavar="PATH",
+        help="从目录（每个文件一个或多个账号）、多文档 YAML 文件或 SQLite 数据库（.db）逐个读取账号，代替配置中的 accounts（也可用环境变量 MHYY_ACCOUNTS_FROM 或配置 account_source）",
+    )
+    parser.add_argument(
+        "--results",
+        default=os.environ.get("MHYY_RESULTS"),
+        metavar="FILE",
+        help="逐个账号以 JSON Lines 格式追加写入结果记录，- 表示标准输出（也可用环境变量 MHYY_RESULTS 或配置 results.path）",
     )
-    os._exit(0)
-logger.info(f"检测到 {len(accounts_conf)} 个账号，正在进行任务……")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        default=os.environ.get("MHYY_DAEMON", "").lower() in ("1", "true", "yes"),
+        help="守护模式：常驻运行，按配置 daemon.schedule 定时签到，config.yml 修改后自动重新加载（也可用环境变量 MHYY_DAEMON=1）",
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument(
+        "--record",
+        default=os.environ.get("MHYY_RECORD"),
+        metavar="FILE",
+        help="录制模式：把所有请求的响应（不含 token）写入录制文件，.gz 结尾时压缩（也可用环境变量 MHYY_RECORD）",
+    )
+    cassette.add_argument(
+        "--replay",
+        default=os.environ.get("MHYY_REPLAY"),
+        metavar="FILE",
+        help="回放模式：不访问网络，使用录制文件中的响应运行（也可用环境变量 MHYY_REPLAY）",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        type=float,
+        default=float(os.environ.get("MHYY_REPLAY_LATENCY") or 0),
+        metavar="FACTOR",
+        help="回放时按录制的响应耗时乘以该系数等待，默认 0 不等待，1 为原速（也可用环境变量 MHYY_REPLAY_LATENCY）",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=DEFAULT_DIRECTORY,
+        metavar="DIR",
+        help="性能分析模式：记录 cProfile、内存分配和各阶段耗时，运行结束后把报告写入 DIR 下的新目录，默认 .mhyy_profile（也可用环境变量 MHYY_PROFILE）",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--incremental",
+        action="store_true",
+        default=None,
+        help="增量模式：跳过今天（北京时间）已确认签到的账号（也可用环境变量 MHYY_INCREMENTAL=1 或配置 state.incremental）",
+    )
+    mode.add_argument(
+        "--full",
+        dest="incremental",
+        action="store_false",
+        help="强制处理全部账号（包括已知登录过期的账号），忽略增量设置",
+    )
+    args = parser.parse_args(argv)
+    if args.incremental is None and os.environ.get("MHYY_INCREMENTAL"):
+        args.incremental = os.environ["MHYY_INCREMENTAL"].lower() not in ("0", "false", "no", "")
+    return args
 
 
-def send_notifications(message: str, settings: dict, proxy: str = None):
-    """Sends message to configured notification services."""
-    if not message or not settings:
-        logger.debug("No message to send or no notification settings configured.")
-        return
+async def merge(files):
+    blocks = merge_shard_results(files)
+    logger.info(f"共合并 {len(blocks)} 个账号的结果，正在推送汇总消息……")
+    async with make_registry(full_config, trace=PROFILER) as registry:
+        await Dispatcher(notification_settings, registry).dispatch_digest(blocks)
 
-    logger.info("Attempting to send notifications...")
 
-    # ServerChan (SCT)
-    sct_conf = settings.get("serverchan", {})
-    sct_key = sct_conf.get("key")
-    if sct_key:
-        sct_url = f"https://sctapi.ftqq.com/{sct_key}.send"
-        try:
-            payload = {"title": "MHYY-AutoCheckin 状态推送", "desp": message}
-            response = httpx.get(sct_url, params=payload, timeout=10)
-            response.raise_for_status()
-            logger.info("ServerChan notification sent successfully.")
-        except httpx.HTTPStatusError as e:
-            logger.error(
-                f"ServerChan HTTP error occurred: {e.response.status_code} - {e.response.text}"
-            )
-        except httpx.RequestError as e:
-            logger.error(f"An error occurred while requesting ServerChan: {e}")
-        except Exception as e:
-            logger.error(
-                f"An unexpected error occurred sending ServerChan notification: {e}"
-            )
-    else:
-        logger.debug("ServerChan not configured.")
+async def timed_check_in(
+    session: Session, metrics_settings: MetricsSettings, timer: PhaseTimer = None
+) -> int:
+    """check_in plus the run-level metrics, written out after every pass."""
+    started = time.monotonic()
+    try:
+        return await check_in(session, timer)
+    finally:
+        session.metrics.set("mhyy_run_duration_seconds", time.monotonic() - started)
+        session.metrics.set("mhyy_run_finished_timestamp_seconds", time.time())
+        if metrics_settings.textfile:
+            write_textfile(session.metrics, metrics_settings.textfile)
+
+
+async def run_once(session: Session, metrics_settings: MetricsSettings):
+    # A one-shot run is timed from process start, config parsing included
+    timer = PhaseTimer(STARTED)
+    timer.mark("config", CONFIG_LOADED)
+    try:
+        await timed_check_in(session, metrics_settings, timer)
+    finally:
+        await session.aclose()
 
-    # DingTalk
-    dingtalk_conf = settings.get("dingtalk", {})
-    dingtalk_webhook_url = dingtalk_conf.get("webhook_url")
-    if dingtalk_webhook_url:
-        try:
-            payload = {"msgtype": "text", "text": {"content": message}}
-            response = httpx.post(dingtalk_webhook_url, json=payload, timeout=10)
-            response.raise_for_status()
-            result = response.json()
-            if result.get("errcode") == 0:
-                logger.info("DingTalk notification sent successfully.")
-            else:
-                logger.error(
-                    f"DingTalk error: {result.get('errcode')} - {result.get('errmsg')}"
-                )
-        except httpx.HTTPStatusError as e:
-            logger.error(
-                f"DingTalk HTTP error occurred: {e.response.status_code} - {e.response.text}"
-            )
-        except httpx.RequestError as e:
-            logger.error(f"An error occurred while requesting DingTalk: {e}")
-        except Exception as e:
-            logger.error(
-                f"An unexpected error occurred sending DingTalk notification: {e}"
-            )
-    else:
-        logger.debug("DingTalk not configured.")
 
-    # PushPlus
-    sct_conf = settings.get("pushplus", {})
-    sct_key = sct_conf.get("key")
-    if sct_key:
-        sct_url = f"http://www.pushplus.plus/send/{sct_key}"
-        try:
-            payload = {"title": "MHYY-AutoCheckin 状态推送", "content": message}
-            response = httpx.post(sct_url, data=payload, timeout=10)
-            response.raise_for_status()
-            logger.info("PushPlus notification sent successfully.")
-        except httpx.HTTPStatusError as e:
-            logger.error(
-                f"PushPlus HTTP error occurred: {e.response.status_code} - {e.response.text}"
-            )
-        except httpx.RequestError as e:
-            logger.error(f"An error occurred while requesting PushPlus: {e}")
-        except Exception as e:
-            logger.error(
-                f"An unexpected error occurred sending PushPlus notification: {e}"
-            )
+async def daemon(session: Session, metrics_settings: MetricsSettings):
+    """Stays resident and runs a pass on the ``daemon`` schedule, reloading config.yml when it changes."""
+    settings = DaemonSettings.from_config(session.config.get("daemon"))
+    watcher = None
+    if os.environ.get("MHYY_CONFIG"):
+        logger.info("配置来自环境变量 MHYY_CONFIG，不会自动重新加载")
     else:
-        logger.debug("PushPlus not configured.")
+        watcher = ConfigWatcher("config.yml")
 
+    async def reload():
+        config = ReadConf("MHYY_CONFIG", None)
+        if not isinstance(config, dict):
+            raise RunError("配置文件为空或无法解析")
+        await session.reconfigure(config)
+        logger.info("配置已重新加载")
+        return DaemonSettings.from_config(config.get("daemon"))
 
-    # Telegram
-    telegram_conf = settings.get("telegram", {})
-    telegram_bot_token = telegram_conf.get("bot_token")
-    telegram_chat_id = telegram_conf.get("chat_id")
-    if telegram_bot_token and telegram_chat_id:
-        telegram_url = f"https://api.telegram.org/bot{telegram_bot_token}/sendMessage"
+    async def run_pass():
         try:
-            # Telegram text message parameters
-            params = {
-                "chat_id": telegram_chat_id,
-                "text": message,
-                # Optional: parse_mode can be 'MarkdownV2', 'HTML', or None
-                # For simplicity, sending as plain text. Be careful with special characters if using Markdown/HTML.
-                # "parse_mode": "HTML"
-            }
-            logger.info("Sending Telegram notification...")
-            logger.debug(f"Proxy settings: {proxy}")
-            response = httpx.get(telegram_url, params=params, timeout=10, proxy=proxy)
-            response.raise_for_status()  # Raise an exception for bad status codes
-            result = response.json()
-            logger.info(f"Telegram response: {result}")
-            if result.get("ok"):
-                logger.info("Telegram notification sent successfully.")
-            else:
-                logger.error(
-                    f"Telegram error: {result.get('error_code')} - {result.get('description')}"
-                )
-        except httpx.HTTPStatusError as e:
-            logger.error(
-                f"Telegram HTTP error occurred: {e.response.status_code} - {e.response.text}"
-            )
-        except httpx.RequestError as e:
-            logger.error(f"An error occurred while requesting Telegram: {e}")
-        except Exception as e:
-            logger.error(
-                f"An unexpected error occurred sending Telegram notification: {e}"
-            )
-    else:
-        logger.debug("Telegram not configured.")
-
-
-class RunError(Exception):
-    pass
+            if not session.has_accounts():
+                logger.error("配置中没有 'accounts' 部分，跳过本次签到")
+                return
+            await timed_check_in(session, metrics_settings)
+        except RunError as e:
+            logger.error(str(e))
+        logger.info("本次签到任务已经执行完毕！")
+
+    logger.info(f"守护模式已启动，签到计划: {settings.schedule}（北京时间），随机延迟最多 {settings.jitter:g} 秒")
+    try:
+        await run_daemon(settings, run_pass, reload, watcher, idle=session.flush_outbox)
+    finally:
+        await session.aclose()
 
 
 if __name__ == "__main__":
-    if not os.environ.get("MHYY_DEBUG", False):
-        wait_time = random.randint(1, 2)  # Random Sleep to Avoid Ban
-        logger.info(
-            f"为了避免同一时间签到人数太多导致被官方怀疑，开始休眠 {wait_time} 秒"
-        )
-        time.sleep(wait_time)
-
-    version = "5.0.0"  # Default version
-    try:
-        ver_info = httpx.get(
-            "https://hyp-api.mihoyo.com/hyp/hyp-connect/api/getGameBranches?game_ids[]=1Z8W5NHUQb&launcher_id=jGHBHlcOq1",
-            timeout=60,
-            verify=False,
-        ).text
-        version = json.loads(ver_info)["data"]["game_branches"][0]["main"]["tag"]
-        logger.info(f"从官方API获取到云·原神最新版本号：{version}")
-    except Exception as e:
-        logger.warning(f"获取版本号失败，使用默认版本：{version}. Error: {e}")
-
-    for config in accounts_conf:
-        notification_msg = (
-            "【MHYY】签到状态推送\n\n"  # Message container for the current account
-        )
-
-        # 各种API的URL
-        NotificationURL = "https://api-cloudgame.mihoyo.com/hk4e_cg_cn/gamer/api/listNotifications?status=NotificationStatusUnread&type=NotificationTypePopup&is_sort=true"
-        WalletURL = "https://api-cloudgame.mihoyo.com/hk4e_cg_cn/wallet/wallet/get"
-        AnnouncementURL = (
-            "https://api-cloudgame.mihoyo.com/hk4e_cg_cn/gamer/api/getAnnouncementInfo"
-        )
-
-        # Validate account config entry
-        if not isinstance(config, dict) or "token" not in config:
-            error_msg = f"跳过无效的账号配置条目: {config}"
-            logger.error(error_msg)
-            notification_msg += error_msg + "\n"
-            send_notifications(
-                notification_msg, notification_settings, proxy=proxy_settings if proxy_settings else None
-            )  # Notify about invalid config
-            continue  # Skip this entry
-
+    args = parse_args()
+    if args.merge:
+        asyncio.run(merge(args.merge))
+        logger.info("所有任务已经执行完毕！")
+        raise SystemExit(0)
+
+    shard = None
+    if args.shard:
         try:
-            token = config["token"]
-            client_type = config.get("type", 5)
-            sysver = config.get("sysver", "14.0")
-            deviceid = config["deviceid"]
-            devicename = config.get("devicename", "iPhone 13")
-            devicemodel = config.get("devicemodel", "iPhone13,3")
-            appid = config.get("appid", "1953439978")
-
-            # Construct headers
-            headers = {
-                "x-rpc-combo_token": token,
-                "x-rpc-client_type": str(client_type),
-                "x-rpc-app_version": str(version),
-                "x-rpc-sys_version": str(sysver),
-                "x-rpc-channel": "cyydmihoyo",
-                "x-rpc-device_id": deviceid,
-                "x-rpc-device_name": devicename,
-                "x-rpc-device_model": devicemodel,
-                "x-rpc-vendor_id": "1",
-                "x-rpc-cg_game_biz": "hk4e_cn",
-                "x-rpc-op_biz": "clgm_cn",
-                "x-rpc-language": "zh-cn",
-                "Host": "api-cloudgame.mihoyo.com",
-                "Connection": "Keep-Alive",
-                "Accept-Encoding": "gzip",
-                "User-Agent": f"Mozilla/5.0 (iPhone; CPU iPhone OS {sysver} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
-            }
-
-            bbsid_match = re.search(r"oi=(\d+)", token)
-            bbsid = bbsid_match.group(1) if bbsid_match else "N/A"
-
-            region = config.get("region", "cn")
-            if region == "os":
-                headers["x-rpc-channel"] = "mihoyo"
-                headers["x-rpc-cg_game_biz"] = "hk4e_global"
-                headers["x-rpc-op_biz"] = "clgm_global"
-                headers["x-rpc-cg_game_id"] = "9000254"
-                headers["x-rpc-app_id"] = "600493"
-                headers["User-Agent"] = "okhttp/4.10.0"
-                headers["Host"] = "sg-cg-api.hoyoverse.com"
-                NotificationURL = "https://sg-cg-api.hoyoverse.com/hk4e_global/cg/gamer/api/listNotifications?status=NotificationStatusUnread&type=NotificationTypePopup&is_sort=true"
-                WalletURL = (
-                    "https://sg-cg-api.hoyoverse.com/hk4e_global/cg/wallet/wallet/get"
-                )
-                AnnouncementURL = "https://sg-cg-api.hoyoverse.com/hk4e_global/cg/gamer/api/getAnnouncementInfo"
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            logger.error(str(e))
+            raise SystemExit(2)
 
-            logger.info(
-                f"--- 正在进行第 {accounts_conf.index(config) + 1} 个账号 (BBSID: {bbsid})，服务器为{'CN' if region != 'os' else 'GLOBAL'} ---"
-            )
-            notification_msg += (
-                f"☁️ 云原神签到结果 ({'CN' if region != 'os' else 'GLOBAL'}):\n"
-            )
-            notification_msg += (
-                f"账号 {accounts_conf.index(config) + 1} (BBSID: {bbsid})\n\n"
-            )
+    try:
+        cassette = open_cassette(args.record, args.replay, args.replay_latency)
+    except (OSError, ValueError) as e:
+        logger.error(f"无法打开录制文件: {e}")
+        raise SystemExit(2)
+
+    # Metrics: Prometheus textfile after every pass and/or a local /metrics endpoint
+    metrics = Metrics()
+    metrics_settings = MetricsSettings.from_config(full_config.get("metrics"))
+    metrics_server = None
+    if metrics_settings.port:
+        try:
+            metrics_server = serve(metrics, metrics_settings.port, metrics_settings.host)
+        except OSError as e:
+            logger.warning(f"无法启动指标接口: {e}")
 
-            try:
-                wallet_res = httpx.get(
-                    WalletURL, headers=headers, timeout=30, verify=False
+    session = Session(full_config, args, metrics, shard, cassette, PROFILER)
+    try:
+        if args.daemon:
+            asyncio.run(daemon(session, metrics_settings))
+        else:
+            if not session.has_accounts():
+                logger.error(
+                    "请正确配置环境变量 MHYY_CONFIG 或者 config.yml 并包含 'accounts' 部分后再运行本脚本！"
                 )
-                wallet_res.raise_for_status()
-                wallet_data = wallet_res.json()
-                logger.debug(f"Wallet response: {wallet_data}")
-
-                if wallet_data.get("retcode") == -100:
-                    error_msg = f"当前登录已过期，请重新登陆！返回为：{wallet_data.get('message', 'Unknown error')}"
-                    logger.error(error_msg)
-                    notification_msg += error_msg + "\n"
-                elif wallet_data.get("retcode") == 0 and wallet_data.get("data"):
-                    free_time = wallet_data["data"]["free_time"]["free_time"]
-                    play_card_msg = wallet_data["data"]["play_card"]["short_msg"]
-                    coin_num = wallet_data["data"]["coin"]["coin_num"]
-                    coin_minutes = int(coin_num) / 10 if coin_num is not None else 0
-                    wallet_status = f"✅ 钱包：免费时长 {free_time} 分钟，畅玩卡状态为「{play_card_msg}」，拥有原点 {coin_num} 点 ({coin_minutes:.0f}分钟)\n"
-                    logger.info(wallet_status.strip())
-                    notification_msg += wallet_status
-                else:
-                    error_msg = f"获取钱包信息失败: {wallet_data.get('retcode')} - {wallet_data.get('message', 'Unknown error')}"
-                    logger.error(error_msg)
-                    notification_msg += error_msg + "\n"
-
-            except httpx.HTTPStatusError as e:
-                error_msg = f"获取钱包信息HTTP错误: {e.response.status_code} - {e.response.text}"
-                logger.error(error_msg)
-                notification_msg += error_msg + "\n"
-            except httpx.RequestError as e:
-                error_msg = f"请求钱包信息失败: {e}"
-                logger.error(error_msg)
-                notification_msg += error_msg + "\n"
-            except Exception as e:
-                error_msg = f"解析钱包信息出错: {e}"
-                logger.error(error_msg)
-                notification_msg += error_msg + "\n"
-
-            # --- Check Sign-in Status ---
+                flush_logging()
+                os._exit(0)
             try:
-                announcement_res = httpx.get(
-                    AnnouncementURL, headers=headers, timeout=30, verify=False
-                )
-                announcement_res.raise_for_status()
-                # logger.debug(f'Announcement response: {announcement_res.text}') # Too verbose usually
-
-                notification_res = httpx.get(
-                    NotificationURL, headers=headers, timeout=30, verify=False
-                )
-                notification_res.raise_for_status()
-                notification_data = notification_res.json()
-                logger.debug(f"Notification response: {notification_data}")
-
-                sign_in_status = "❓ 未知签到状态"  # Default status
-
-                if notification_data.get("retcode") == 0 and notification_data.get(
-                    "data"
-                ):
-                    notification_list = notification_data["data"].get("list", [])
-
-                    if not notification_list:
-                        sign_in_status = "✅ 今天似乎已经签到过了！(通知列表为空)"
-                        logger.info(sign_in_status)
-                        notification_msg += sign_in_status + "\n"
-                    else:
-                        # Look for a notification indicating sign-in reward or limit reached
-                        # The logic here was a bit fragile, let's try to be more robust
-                        # Look for specific message patterns if possible, or just check the presence of notifications
-
-                        last_notification_msg = notification_list[0].get("msg")
-                        if len(notification_list) > 0:
-                            last_notification_msg = notification_list[-1].get("msg")
-
-                        try:
-                            # Attempt to parse the 'msg' field which is often a JSON string itself
-                            msg_payload = json.loads(last_notification_msg)
-                            logger.debug(
-                                f"Parsed last notification msg payload: {msg_payload}"
-                            )
-
-                            if msg_payload.get("msg") == "每日登录奖励" or msg_payload.get("msg") == "每日登陆奖励":
-                                # This indicates a successful sign-in
-                                sign_in_status = f"✅ 获取签到情况成功！{msg_payload.get('msg')}：获得 {msg_payload.get('num')} 分钟"
-                                logger.info(sign_in_status)
-                                notification_msg += sign_in_status + "\n"
-                            elif msg_payload.get("over_num", 0) > 0:
-                                sign_in_status = f"✅ 获取签到情况成功！免费时长已达上限，只能获得 {msg_payload.get('num')} 分钟 (超出 {msg_payload.get('over_num')} 分钟)"
-                                logger.info(sign_in_status)
-                                notification_msg += sign_in_status + "\n"
-                            else:
-                                sign_in_status = f"❓ 获取到其他通知，可能已经签到或状态未知: {last_notification_msg}"
-                                logger.info(sign_in_status)
-                                notification_msg += sign_in_status + "\n"
-
-                        except json.JSONDecodeError:
-                            # 'msg' is not a JSON string
-                            sign_in_status = f"❓ 获取到非标准通知，可能已经签到或状态未知: {last_notification_msg}"
-                            logger.info(sign_in_status)
-                            notification_msg += sign_in_status + "\n"
-                        except Exception as e:
-                            # Other errors during parsing msg
-                            sign_in_status = f"❌ 解析通知详情时出错: {e}. Raw msg: {last_notification_msg}"
-                            logger.error(sign_in_status)
-                            notification_msg += sign_in_status + "\n"
-
-                elif notification_data.get("retcode") != 0:
-                    error_msg = f"获取通知列表失败: {notification_data.get('retcode')} - {notification_data.get('message', 'Unknown error')}"
-                    logger.error(error_msg)
-                    notification_msg += error_msg + "\n"
-
-            except httpx.HTTPStatusError as e:
-                error_msg = f"获取通知列表HTTP错误: {e.response.status_code} - {e.response.text}"
-                logger.error(error_msg)
-                notification_msg += error_msg + "\n"
-            except httpx.RequestError as e:
-                error_msg = f"请求通知列表失败: {e}"
-                logger.error(error_msg)
-                notification_msg += error_msg + "\n"
-            except Exception as e:
-                error_msg = f"检查签到状态时出错: {e}"
-                logger.error(error_msg)
-                notification_msg += error_msg + "\n"
-
-        except KeyError as e:
-            # This catches missing required keys in account config
-            error_msg = f"账号配置缺少必需的键: {e}"
-            logger.error(error_msg)
-            notification_msg += f"❌ 账号配置错误: {error_msg}\n"
-        except Exception as e:
-            # Catch any other unexpected errors during account processing
-            error_msg = f"处理账号时发生未知错误: {e}"
-            logger.error(error_msg)
-            notification_msg += f"❌ 账号处理错误: {error_msg}\n"
-
-        if accounts_conf.index(config) < len(accounts_conf) - 1:
-            notification_msg += "\n---\n\n"
-
-        send_notifications(notification_msg, notification_settings, proxy=proxy_settings if proxy_settings else None)
-
-    logger.info("所有任务已经执行完毕！")
+                asyncio.run(run_once(session, metrics_settings))
+            except RunError as e:
+                logger.error(str(e))
+                raise SystemExit(1)
+            logger.info("所有任务已经执行完毕！")
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if PROFILER is not None:
+            try:
+                logger.info(f"性能分析报告已写入 {PROFILER.write(metrics)}")
+            except OSError as e:
+                logger.warning(f"无法写入性能分析报告: {e}")
@@ -0,0 +1 @@
+"""Shared building blocks for the MHYY-AutoCheckin entry points (main.py / scf.py)."""
@@ -0,0 +1,52 @@
+import json
+import os
+
+
+def cache_path(name: str) -> str:
+    """Returns the path of ``name`` inside the cache directory (``MHYY_CACHE_DIR``, default ``.mhyy_cache``)."""
+    return os.path.join(os.environ.get("MHYY_CACHE_DIR", ".mhyy_cache"), name)
+
+
+def read_json(path: str):
+    """Reads a JSON file, returning None when it is missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _create_temp(directory: str):
+    """
+    Creates a new temporary file in ``directory``; returns ``(fd, path)``.
+    Unlike mkstemp (0600) it is created 0666 less the umask, like any written
+    file, so e.g. node_exporter (another user) can read the metrics textfile.
+    """
+    while True:
+        tmp_path = os.path.join(directory, f".tmp-{os.getpid()}-{os.urandom(4).hex()}")
+        try:
+            return os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+
+def write_text(path: str, text: str):
+    """Writes ``text`` atomically so readers never see a partial file."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = _create_temp(directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_json(path: str, data):
+    """Writes ``data`` as JSON atomically so readers never see a partial file."""
+    write_text(path, json.dumps(data, ensure_ascii=False))
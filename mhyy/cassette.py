@@ -0,0 +1,241 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Webhook URLs carry the key or bot token (and the message) in the path or
+# query, so only the host of these is kept
+SECRET_URL_HOSTS = ("sctapi.ftqq.com", "oapi.dingtalk.com", "www.pushplus.plus", "api.telegram.org")
+TOKEN_HEADER = "x-rpc-combo_token"
+# Response headers the code looks at; everything else (cookies included) is dropped
+KEPT_HEADERS = ("content-type", "etag", "last-modified", "retry-after")
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+def request_route(request: httpx.Request) -> str:
+    """``METHOD host/path`` of a request, without query and without secret paths."""
+    host = request.url.host
+    if host in SECRET_URL_HOSTS:
+        return f"{request.method} {host}"
+    return f"{request.method} {host}{request.url.path}"
+
+
+def request_account(request: httpx.Request) -> str:
+    """Hash of the account token sent with a cloud-game API request, "" for other requests."""
+    token = request.headers.get(TOKEN_HEADER)
+    return token_hash(token) if token else ""
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class CassetteRecorder:
+    """
+    Writes every exchange as one JSON line: route, account hash, status, the
+    few response headers that matter, the decoded body and the elapsed time.
+    Request headers and bodies (tokens, cookies, messages) are never stored.
+    A ``.gz`` path is gzip-compressed.
+    """
+
+    records = True
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = _open(path, "w")
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, request: httpx.Request, response: httpx.Response, elapsed: float):
+        entry = {
+            "route": request_route(request),
+            "account": request_account(request),
+            "status": response.status_code,
+            "headers": {
+                key: response.headers[key] for key in KEPT_HEADERS if key in response.headers
+            },
+            "body": response.text,
+            "elapsed": round(elapsed, 4),
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+
+    def transport(self, inner):
+        return RecordingTransport(inner, self)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        logger.info(f"已录制 {self.count} 个请求到 {self.path}")
+
+
+class Cassette:
+    """
+    Recorded exchanges served back in order. A request is matched on route and
+    account hash; once an account's responses for a route are used up the last
+    one repeats. Accounts missing from the cassette get the responses of the
+    recorded ones for the same route in turn, so a small recording can drive a
+    large synthetic run. ``latency`` scales the recorded elapsed times (0 = none).
+    """
+
+    records = False
+
+    def __init__(self, entries, latency: float = 0.0):
+        self.latency = latency
+        self._exact = defaultdict(deque)
+        self._by_route = defaultdict(list)
+        self._turn = defaultdict(int)
+        self._lock = threading.Lock()
+        for entry in entries:
+            self._exact[(entry["route"], entry["account"])].append(entry)
+            self._by_route[entry["route"]].append(entry)
+
+    @classmethod
+    def load(cls, path: str, latency: float = 0.0):
+        with _open(path, "r") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        logger.info(f"从 {path} 载入 {len(entries)} 个录制的请求")
+        return cls(entries, latency)
+
+    def match(self, request: httpx.Request) -> dict:
+        route = request_route(request)
+        with self._lock:
+            queue = self._exact.get((route, request_account(request)))
+            if queue:
+                return queue.popleft() if len(queue) > 1 else queue[0]
+            candidates = self._by_route.get(route)
+            if not candidates:
+                raise httpx.ConnectError(f"录制文件中没有 {route} 的响应", request=request)
+            turn = self._turn[route]
+            self._turn[route] = turn + 1
+            return candidates[turn % len(candidates)]
+
+    def delay(self, entry: dict) -> float:
+        return self.latency * entry.get("elapsed", 0.0)
+
+    @staticmethod
+    def response(entry: dict, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            entry["status"],
+            headers=entry["headers"],
+            content=entry["body"].encode("utf-8"),
+            request=request,
+        )
+
+    def transport(self, inner=None):
+        return ReplayTransport(self)
+
+    def close(self):
+        pass
+
+
+class RecordingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Passes requests to ``inner`` (the real sync or async transport) and records the answers."""
+
+    def __init__(self, inner, recorder: CassetteRecorder):
+        self.inner = inner
+        self.recorder = recorder
+
+    def _forward(self, request, response: httpx.Response, raw: bytes, started: float):
+        # One copy is decoded for the cassette; the client gets the raw body
+        # still encoded, exactly as received
+        recorded = httpx.Response(response.status_code, headers=response.headers, content=raw)
+        recorded.read()
+        self.recorder.record(request, recorded, time.monotonic() - started)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            content=raw,
+            extensions=response.extensions,
+        )
+
+    def handle_request(self, request):
+        started = time.monotonic()
+        response = self.inner.handle_request(request)
+        try:
+            raw = b"".join(response.iter_raw())
+        except httpx.StreamConsumed:  # in-memory transports answer with a read response
+            raw = response.content
+        finally:
+            response.close()
+        return self._forward(request, response, raw, started)
+
+    async def handle_async_request(self, request):
+        started = time.monotonic()
+        response = await self.inner.handle_async_request(request)
+        try:
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+        except httpx.StreamConsumed:
+            raw = response.content
+        finally:
+            await response.aclose()
+        return self._forward(request, response, raw, started)
+
+    def close(self):
+        self.inner.close()
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Answers every request from a Cassette; nothing goes to the network."""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+
+    def handle_request(self, request):
+        entry = self.cassette.match(request)
+        delay = self.cassette.delay(entry)
+        if delay:
+            time.sleep(delay)
+        return self.cassette.response(entry, request)
+
+    async def handle_async_request(self, request):
+        entry = self.cassette.match(request)
+        delay = self.cassette.delay(entry)
+        if delay:
+            await asyncio.sleep(delay)
+        return self.cassette.response(entry, request)
+
+
+def open_cassette(record: str = None, replay: str = None, latency: float = 0.0):
+    """A CassetteRecorder for ``record``, a Cassette for ``replay``, or None for the network."""
+    if record and replay:
+        raise ValueError("不能同时录制和回放")
+    if record:
+        logger.info(f"录制模式：所有请求的响应将写入 {record}（不含 token）")
+        return CassetteRecorder(record)
+    if replay:
+        logger.info(f"回放模式：不访问网络，使用 {replay} 中录制的响应")
+        return Cassette.load(replay, latency)
+    return None
+
+
+def cassette_from_env():
+    """The cassette selected by MHYY_RECORD / MHYY_REPLAY / MHYY_REPLAY_LATENCY (scf.py)."""
+    return open_cassette(
+        os.environ.get("MHYY_RECORD"),
+        os.environ.get("MHYY_REPLAY"),
+        float(os.environ.get("MHYY_REPLAY_LATENCY") or 0),
+    )
@@ -0,0 +1,94 @@
+from dataclasses import dataclass
+
+from .runner import (
+    SIGN_IN_ALREADY,
+    SIGN_IN_CAPPED,
+    SIGN_IN_CLAIMED,
+    SIGN_IN_ERROR,
+    SIGN_IN_EXPIRED,
+    SIGN_IN_INVALID,
+    SIGN_IN_UNKNOWN,
+)
+
+# Outcomes that are always worth a push
+ANOMALOUS_SIGN_INS = frozenset({SIGN_IN_UNKNOWN, SIGN_IN_EXPIRED, SIGN_IN_ERROR, SIGN_IN_INVALID})
+
+# A claimed reward on the first run of the day and an empty list on later runs
+# are the same routine success, so moving between them is not a change
+ROUTINE_SIGN_INS = frozenset({SIGN_IN_CLAIMED, SIGN_IN_ALREADY})
+
+SIGN_IN_LABELS = {
+    SIGN_IN_CLAIMED: "已领取每日奖励",
+    SIGN_IN_CAPPED: "免费时长已达上限",
+    SIGN_IN_ALREADY: "今天已签到",
+    SIGN_IN_UNKNOWN: "未知签到状态",
+    SIGN_IN_EXPIRED: "登录已过期",
+    SIGN_IN_ERROR: "签到检查出错",
+    SIGN_IN_INVALID: "账号配置错误",
+}
+
+
+@dataclass
+class ChangeSettings:
+    """Change-only notifications (``on_change`` / ``full_summary_every`` in the ``notifications`` section)."""
+
+    on_change: bool = False  # push only accounts whose wallet or sign-in changed, and anomalies
+    full_summary_every: int = 7  # days between runs that push every account anyway, 0 never
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        return cls(
+            on_change=bool(conf.get("on_change", cls.on_change)),
+            full_summary_every=max(0, int(conf.get("full_summary_every", cls.full_summary_every))),
+        )
+
+
+def _delta(label: str, old, new, unit: str = "") -> str:
+    line = f"{label}：{old}{unit} → {new}{unit}"
+    if isinstance(old, int) and isinstance(new, int):
+        line += f"（{new - old:+d}）"
+    return line
+
+
+def change_lines(previous: dict, result) -> list:
+    """
+    What changed between the stored state of an account (StateStore.get) and
+    its new AccountResult, as message lines; empty when nothing did.
+    """
+    lines = []
+    old_sign_in = previous.get("sign_in")
+    if result.sign_in != old_sign_in and not {result.sign_in, old_sign_in} <= ROUTINE_SIGN_INS:
+        lines.append(
+            _delta(
+                "签到状态",
+                SIGN_IN_LABELS.get(old_sign_in, old_sign_in),
+                SIGN_IN_LABELS.get(result.sign_in, result.sign_in),
+            )
+        )
+    old_wallet, wallet = previous.get("wallet") or {}, result.wallet
+    if wallet and old_wallet:
+        if wallet.get("free_time") != old_wallet.get("free_time"):
+            lines.append(_delta("免费时长", old_wallet.get("free_time"), wallet.get("free_time"), " 分钟"))
+        if wallet.get("play_card") != old_wallet.get("play_card"):
+            lines.append(_delta("畅玩卡", old_wallet.get("play_card"), wallet.get("play_card")))
+        if wallet.get("coin_num") != old_wallet.get("coin_num"):
+            lines.append(_delta("原点", old_wallet.get("coin_num"), wallet.get("coin_num"), " 点"))
+    return lines
+
+
+def change_body(previous: dict, result):
+    """
+    The message body to push for ``result`` in change-only mode, or None when
+    it can be skipped. Anomalies and accounts without a stored snapshot get
+    their full body; otherwise only the changed fields are listed.
+    """
+    if previous is None or result.sign_in in ANOMALOUS_SIGN_INS or result.errors:
+        return result.body
+    if result.wallet and not previous.get("wallet"):
+        return result.body  # first wallet reading, nothing to compare with
+    lines = change_lines(previous, result)
+    if not lines:
+        return None
+    heading = result.body.split("\n\n", 1)[0]
+    return heading + "\n\n🔄 与上次相比：\n" + "\n".join(lines) + "\n"
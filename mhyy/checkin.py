@@ -0,0 +1,372 @@
+import contextlib
+import itertools
+import logging
+import os
+import sqlite3
+import time
+
+from .changes import ChangeSettings, change_body
+from .clients import ClientRegistry, HttpSettings
+from .metrics import Metrics, PhaseTimer
+from .notify import Dispatcher
+from .outbox import OutboxSettings, QueuedDispatcher, open_outbox
+from .profiles import compile_accounts, iter_profiles
+from .ratelimit import RateLimitSettings
+from .resilience import Resilience, ResilienceSettings
+from .results import ResultWriter
+from .runner import MESSAGE_HEADER, RunnerLimits, expired_summary, run_accounts
+from .shard import select_shard, write_shard_results
+from .sources import AccountSource
+from .state import StateSettings, open_store, shanghai_day
+from .version import VersionCache, VersionCacheSettings
+
+logger = logging.getLogger(__name__)
+
+
+class RunError(Exception):
+    pass
+
+
+def skip_known(profiles, fingerprints, on_skip):
+    """Yields the profiles whose fingerprint is not in ``fingerprints``, calling ``on_skip`` for the others."""
+    for profile in profiles:
+        if getattr(profile, "fingerprint", None) in fingerprints:
+            on_skip(profile)
+        else:
+            yield profile
+
+
+def make_registry(config: dict, cassette=None, trace=None, transport=None):
+    """The pooled clients for ``config`` (``http`` and ``proxy`` sections)."""
+    proxy = config.get("proxy")
+    return ClientRegistry(
+        HttpSettings.from_config(config.get("http")),
+        proxy=proxy or None,
+        transport=transport,
+        cassette=cassette,
+        trace=trace,
+    )
+
+
+class Session:
+    """
+    Everything that outlives one check-in pass: pooled clients, the version
+    cache, circuit breakers, the state store, the result stream and compiled
+    profiles. A one-shot run uses it once; the daemon keeps it warm and
+    swaps in new parts when the config changes.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        args,
+        metrics: Metrics,
+        shard=None,
+        cassette=None,
+        profiler=None,
+        transport=None,
+    ):
+        self.args = args  # parsed main.py options (incremental, results, accounts_from, shard_output)
+        self.metrics = metrics
+        self.shard = shard  # (index, count) or None
+        self.cassette = cassette  # mhyy.cassette recorder / replay, None for the network
+        self.profiler = profiler  # mhyy.profiling.Profiler with --profile
+        self.transport = transport  # replaces the network (benchmarks)
+        self.config = {}
+        self.registry = None
+        self.version_cache = None
+        self.resilience = None
+        self.state_settings = None
+        self.state_store = None
+        self.result_writer = None
+        self.outbox = None
+        self._retired = []  # registries replaced by configure(), closed by reconfigure()
+        self.configure(config)
+
+    def configure(self, config: dict):
+        """Applies ``config``, rebuilding only the parts whose section changed."""
+        old = self.config
+        self.config = config
+
+        def changed(*sections):
+            return any(old.get(section) != config.get(section) for section in sections) or not old
+
+        if self.registry is None or changed("http", "proxy"):
+            if self.registry is not None:
+                self._retired.append(self.registry)
+            self.registry = make_registry(config, self.cassette, self.profiler, self.transport)
+        if self.version_cache is None or changed("version_cache"):
+            self.version_cache = VersionCache(
+                VersionCacheSettings.from_config(config.get("version_cache")), self.metrics
+            )
+        if self.resilience is None or changed("resilience"):
+            self.resilience = Resilience(ResilienceSettings.from_config(config.get("resilience")))
+
+        state_settings = StateSettings.from_config(config.get("state"))
+        if self.args.incremental is not None:
+            state_settings.incremental = self.args.incremental
+        if self.state_settings is None or state_settings.path != self.state_settings.path or (
+            state_settings.enabled != self.state_settings.enabled
+        ):
+            if self.state_store is not None:
+                self.state_store.close()
+            self.state_store = open_store(state_settings)
+        self.state_settings = state_settings
+
+        outbox_settings = OutboxSettings.from_config(config.get("outbox"))
+        if self.outbox is None or changed("outbox"):
+            if self.outbox is not None:
+                self.outbox.close()
+            self.outbox = open_outbox(outbox_settings)
+
+        results_path = self.args.results or (config.get("results") or {}).get("path")
+        if self.result_writer is None or self.result_writer.path != results_path:
+            if self.result_writer is not None:
+                self.result_writer.close()
+            self.result_writer = None
+            if results_path:
+                try:
+                    self.result_writer = ResultWriter(results_path)
+                except OSError as e:
+                    logger.warning(f"无法打开结果记录文件 {results_path}: {e}")
+
+        self.account_source = (
+            AccountSource.from_path(self.args.accounts_from)
+            if self.args.accounts_from
+            else AccountSource.from_config(config.get("account_source"))
+        )
+        self._profiles = None
+
+    async def reconfigure(self, config: dict):
+        self.configure(config)
+        while self._retired:
+            await self._retired.pop().aclose()
+
+    def has_accounts(self) -> bool:
+        return self.account_source is not None or bool(self.config.get("accounts"))
+
+    def profiles(self):
+        """
+        The account profiles of this pass. Config accounts are compiled once
+        and reused while the config is unchanged; a source is re-read lazily
+        every pass so a large fleet is never held in memory.
+        """
+        if self.account_source is not None:
+            logger.info(f"从 {self.account_source} 逐个读取账号，正在进行任务……")
+            return iter_profiles(self.account_source)
+        if self._profiles is None:
+            self._profiles = compile_accounts(self.config.get("accounts"))
+        logger.info(f"检测到 {len(self._profiles)} 个账号，正在进行任务……")
+        return iter(self._profiles)
+
+    def dispatcher(self):
+        """The notification dispatcher of this pass; spools to the outbox when one is open."""
+        dispatcher = Dispatcher(self.config.get("notifications") or {}, self.registry, self.metrics)
+        if self.outbox is None:
+            return dispatcher
+        return QueuedDispatcher(dispatcher, self.outbox)
+
+    async def flush_outbox(self):
+        """Retries queued notifications that are due (between daemon passes)."""
+        if self.outbox is not None:
+            await self.dispatcher().flush()
+
+    async def aclose(self):
+        await self.registry.aclose()
+        if self.cassette is not None:
+            self.cassette.close()
+        if self.outbox is not None:
+            self.outbox.close()
+        if self.state_store is not None:
+            self.state_store.close()
+        if self.result_writer is not None:
+            self.result_writer.close()
+
+
+# Names of the PhaseTimer phases in the startup log line
+STARTUP_PHASES = {
+    "config": "读取配置",
+    "profiles": "准备账号",
+    "version": "获取版本号",
+    "first_request": "首个账号请求",
+}
+
+
+async def check_in(session: Session, timer: PhaseTimer = None) -> int:
+    """One check-in pass over every account; returns the number of processed accounts."""
+    args, config = session.args, session.config
+    notification_settings = config.get("notifications") or {}
+    state_settings, state_store = session.state_settings, session.state_store
+    registry, metrics, result_writer = session.registry, session.metrics, session.result_writer
+    profiler = session.profiler
+    timer = timer or PhaseTimer()
+    # Wall-clock phases for --profile; a no-op context otherwise
+    phase = profiler.phase if profiler is not None else lambda name: contextlib.nullcontext()
+
+    # The version lookup goes first and runs on its own thread, overlapping the
+    # account pipeline below and the start spread; accounts only wait for it
+    # right before their first request, and for at most version_cache.deadline
+    version = session.version_cache.prefetch(registry.get_sync("hyp"))
+    version.add_done_callback(lambda _: timer.mark("version"))
+    if profiler is not None:
+        version_started = time.perf_counter()
+        version.add_done_callback(
+            lambda _: profiler.add("version", time.perf_counter() - version_started)
+        )
+
+    # Accounts flow through a lazy pipeline (source -> compile -> shard -> state
+    # filters -> runner), so a large fleet is never held in memory at once
+    account_profiles = session.profiles()
+    if session.shard:
+        shard_index, shard_count = session.shard
+        account_profiles = select_shard(account_profiles, shard_index, shard_count)
+        logger.info(f"分片 {shard_index}/{shard_count}：只处理属于本分片的账号")
+
+    # Run state: every result is recorded; incremental runs skip accounts confirmed today
+    skipped_confirmed = 0
+
+    def count_confirmed(profile):
+        nonlocal skipped_confirmed
+        skipped_confirmed += 1
+
+    if state_settings.incremental:
+        if state_store is None:
+            logger.warning("增量模式需要运行状态数据库，本次处理全部账号")
+        else:
+            account_profiles = skip_known(
+                account_profiles, state_store.confirmed(), count_confirmed
+            )
+
+    # Negative cache: logins known to be expired are not requested again until
+    # their token changes; one summary per day replaces their messages. --full re-checks them
+    known_expired = []
+    expired_since = {}
+    if state_store is not None and args.incremental is not False:
+        expired_since = state_store.expired()
+        if expired_since:
+            account_profiles = skip_known(account_profiles, expired_since, known_expired.append)
+
+    def expired_reminder():
+        """The summary block of known-expired accounts not yet reminded about today, or None."""
+        if not known_expired:
+            return None
+        logger.warning(f"{len(known_expired)} 个账号的登录已过期，本次跳过，更新 token 后自动恢复")
+        due = state_store.due_reminders(profile.fingerprint for profile in known_expired)
+        reminded = [profile for profile in known_expired if profile.fingerprint in due]
+        if not reminded:
+            return None
+        since = {fp: shanghai_day(expired_since[fp]) for fp in due}
+        return reminded[0].index, expired_summary(reminded, since)
+
+    # Peek so that a pass with nothing left to do ends before any request
+    try:
+        with phase("profiles"):
+            first_profile = next(account_profiles, None)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        version.cancel()
+        raise RunError(f"无法读取账号: {e}")
+    if first_profile is None and not known_expired:
+        version.cancel()
+        logger.info(f"没有需要处理的账号（{skipped_confirmed} 个账号今天已确认签到）")
+        return 0
+    timer.mark("profiles")
+    if first_profile is not None:
+        account_profiles = itertools.chain([first_profile], account_profiles)
+
+    # Spread account starts over a jitter window to avoid a burst (Random Sleep to Avoid Ban)
+    rate_limits = RateLimitSettings.from_config(config.get("ratelimit"))
+    if os.environ.get("MHYY_DEBUG", False):
+        rate_limits.spread = 0
+    elif rate_limits.spread:
+        logger.info(
+            f"为了避免同一时间签到人数太多导致被官方怀疑，账号将在 {rate_limits.spread:g} 秒内错开开始"
+        )
+
+    # per_account: one push per account (default); digest: one summary after the run
+    # With --shard-output the blocks are written out for --merge instead
+    digest_mode = notification_settings.get("mode") == "digest"
+    collect_blocks = digest_mode or bool(args.shard_output)
+    digest_blocks = []
+    # With the outbox, pushes are only queued here and delivered in the background
+    dispatcher = session.dispatcher()
+    if isinstance(dispatcher, QueuedDispatcher):
+        dispatcher.start()
+
+    # on_change: push only what changed since the stored snapshot, plus anomalies;
+    # every full_summary_every days one run pushes every account in full
+    changes = ChangeSettings.from_config(notification_settings)
+    only_changes = False
+    unchanged = 0
+    if changes.on_change:
+        if state_store is None:
+            logger.warning("变化推送模式需要运行状态数据库，本次推送全部账号")
+        elif state_store.full_summary_due(changes.full_summary_every):
+            logger.info("变化推送模式：本次推送全部账号的完整状态")
+        else:
+            only_changes = True
+
+    async def notify(result):
+        nonlocal unchanged
+        if profiler is not None:
+            profiler.account(result)
+        body = result.body
+        if only_changes:
+            # Read before record() replaces the snapshot
+            try:
+                previous = state_store.get(result.fingerprint) if result.fingerprint else None
+            except sqlite3.Error:
+                previous = None
+            body = change_body(previous, result)
+        if state_store is not None:
+            state_store.record(result)
+        if result_writer is not None:
+            result_writer.write(result)
+        if body is None:
+            unchanged += 1
+        elif collect_blocks:
+            digest_blocks.append((result.index, body))
+        elif body is result.body:
+            await dispatcher.dispatch(result.message)
+        else:
+            await dispatcher.dispatch(MESSAGE_HEADER + body)
+
+    try:
+        with phase("accounts"):
+            processed = await run_accounts(
+                account_profiles,
+                version,
+                notify,
+                RunnerLimits.from_config(config.get("runner")),
+                registry=registry,
+                rate_limits=rate_limits,
+                resilience=session.resilience,
+                metrics=metrics,
+                on_first_request=lambda: timer.mark("first_request"),
+            )
+        timer.report(metrics, STARTUP_PHASES)
+        if profiler is not None:
+            profiler.startup.update(timer.phases)
+        logger.info(f"本次共处理 {processed} 个账号")
+        if state_settings.incremental and state_store is not None:
+            logger.info(f"增量模式：{skipped_confirmed} 个账号今天已确认签到，已跳过")
+        if only_changes:
+            logger.info(f"变化推送模式：{unchanged} 个账号与上次相比没有变化，未推送")
+
+        reminder = expired_reminder()
+        if reminder is not None:
+            if collect_blocks:
+                digest_blocks.append(reminder)
+            else:
+                await dispatcher.dispatch(MESSAGE_HEADER + reminder[1])
+        digest_blocks.sort()
+        if args.shard_output:
+            write_shard_results(args.shard_output, args.shard, digest_blocks)
+            logger.info(f"本分片结果已写入 {args.shard_output}")
+        elif digest_mode:
+            await dispatcher.dispatch_digest([body for _, body in digest_blocks])
+    finally:
+        if isinstance(dispatcher, QueuedDispatcher):
+            with phase("notifications"):
+                await dispatcher.close()
+    await session.version_cache.wait()
+    return processed
@@ -0,0 +1,171 @@
+import importlib.util
+import logging
+from dataclasses import dataclass
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Upstream:
+    """Per-upstream client options."""
+
+    timeout: float
+    verify: bool = True
+    use_proxy: bool = False
+
+
+# One pooled client is kept per upstream for the whole run
+UPSTREAMS = {
+    "cn": Upstream(timeout=30, verify=False),  # api-cloudgame.mihoyo.com
+    "os": Upstream(timeout=30, verify=False),  # sg-cg-api.hoyoverse.com
+    "hyp": Upstream(timeout=60, verify=False),  # hyp-api.mihoyo.com
+    "serverchan": Upstream(timeout=10),
+    "dingtalk": Upstream(timeout=10),
+    "pushplus": Upstream(timeout=10),
+    "telegram": Upstream(timeout=10, use_proxy=True),
+}
+
+
+@dataclass
+class HttpSettings:
+    """Connection pool settings (``http`` section of the config)."""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        settings = cls(
+            max_connections=int(conf.get("max_connections", cls.max_connections)),
+            max_keepalive_connections=int(
+                conf.get("max_keepalive_connections", cls.max_keepalive_connections)
+            ),
+            keepalive_expiry=float(conf.get("keepalive_expiry", cls.keepalive_expiry)),
+            http2=bool(conf.get("http2", cls.http2)),
+        )
+        if settings.http2 and importlib.util.find_spec("h2") is None:
+            logger.warning(
+                "HTTP/2 requested but the 'h2' package is not installed "
+                "(pip install 'httpx[http2]'), falling back to HTTP/1.1."
+            )
+            settings.http2 = False
+        return settings
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+class ClientRegistry:
+    """
+    Lazily creates and caches one long-lived httpx client per upstream so that
+    connections are reused across every account of a run. Async and sync
+    clients are cached separately; close the registry once the run is over.
+    ``transport`` replaces the network (benchmarks), for the sync clients too
+    when it is also an ``httpx.BaseTransport``;
+    ``cassette`` (mhyy.cassette) records or replays the traffic of all clients;
+    ``trace`` (mhyy.profiling.Profiler) gets the connection-level timings.
+    """
+
+    def __init__(
+        self,
+        settings: HttpSettings = None,
+        proxy: str = None,
+        transport: httpx.AsyncBaseTransport = None,
+        cassette=None,
+        trace=None,
+    ):
+        self.settings = settings or HttpSettings()
+        self.proxy = proxy or None
+        self.transport = transport
+        self.cassette = cassette
+        self.trace = trace
+        self._async_clients = {}
+        self._sync_clients = {}
+
+    def _client_kwargs(self, name: str) -> dict:
+        upstream = UPSTREAMS[name]
+        kwargs = {
+            "timeout": upstream.timeout,
+            "verify": upstream.verify,
+            "limits": self.settings.limits,
+        }
+        if upstream.use_proxy and self.proxy:
+            kwargs["proxy"] = self.proxy
+        return kwargs
+
+    def _wrap_for_cassette(self, kwargs: dict, transport_class):
+        # The real transport takes over verify / limits / proxy, which httpx
+        # ignores on a client given its own transport
+        inner = None
+        if self.cassette.records:
+            inner = transport_class(
+                verify=kwargs.pop("verify"),
+                limits=kwargs.pop("limits"),
+                http2=self.settings.http2,
+                proxy=kwargs.pop("proxy", None),
+            )
+        kwargs.pop("proxy", None)
+        kwargs["transport"] = self.cassette.transport(inner)
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Returns the shared async client for upstream ``name``."""
+        client = self._async_clients.get(name)
+        if client is None:
+            kwargs = self._client_kwargs(name)
+            if self.transport is not None:
+                kwargs["transport"] = self.transport
+            elif self.cassette is not None:
+                self._wrap_for_cassette(kwargs, httpx.AsyncHTTPTransport)
+            if self.trace is not None:
+                kwargs["event_hooks"] = {"request": [self.trace.async_request_hook]}
+            client = httpx.AsyncClient(http2=self.settings.http2, **kwargs)
+            self._async_clients[name] = client
+        return client
+
+    def get_sync(self, name: str) -> httpx.Client:
+        """Returns the shared blocking client for upstream ``name``."""
+        client = self._sync_clients.get(name)
+        if client is None:
+            kwargs = self._client_kwargs(name)
+            if isinstance(self.transport, httpx.BaseTransport):
+                kwargs["transport"] = self.transport
+            elif self.cassette is not None:
+                self._wrap_for_cassette(kwargs, httpx.HTTPTransport)
+            if self.trace is not None:
+                kwargs["event_hooks"] = {"request": [self.trace.request_hook]}
+            client = httpx.Client(http2=self.settings.http2, **kwargs)
+            self._sync_clients[name] = client
+        return client
+
+    def close(self):
+        for client in self._sync_clients.values():
+            client.close()
+        self._sync_clients.clear()
+
+    async def aclose(self):
+        for client in self._async_clients.values():
+            await client.aclose()
+        self._async_clients.clear()
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import os
+import random
+import signal
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from .state import SHANGHAI
+
+logger = logging.getLogger(__name__)
+
+_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+# (name, lowest, highest) of the five cron fields
+_FIELDS = (("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7))
+
+
+def _parse_field(text: str, low: int, high: int) -> frozenset:
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"无效的步长 {step_text!r}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"取值 {part!r} 超出范围 {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """
+    Standard five-field cron expression (minute hour day month weekday, with
+    ``*``, lists, ranges and steps, plus @hourly / @daily / @weekly / @monthly),
+    evaluated in Asia/Shanghai time like the sign-in day. As in cron, when both
+    day and weekday are restricted a time matches if either does.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = _ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"无效的 cron 表达式 {expression!r}，需要 5 个字段")
+        try:
+            parsed = [
+                _parse_field(text, low, high) for text, (_, low, high) in zip(fields, _FIELDS)
+            ]
+        except ValueError as e:
+            raise ValueError(f"无效的 cron 表达式 {expression!r}: {e}")
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = frozenset(day % 7 for day in weekdays)  # 7 is Sunday too
+        self._days_restricted = fields[2] != "*"
+        self._weekdays_restricted = fields[4] != "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        in_days = moment.day in self.days
+        in_weekdays = moment.isoweekday() % 7 in self.weekdays
+        if self._days_restricted and self._weekdays_restricted:
+            return in_days or in_weekdays
+        return in_days and in_weekdays
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first matching minute strictly after ``moment`` (timezone-aware)."""
+        t = moment.astimezone(SHANGHAI).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)  # long enough for "Feb 29 on a Monday"
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"cron 表达式 {self.expression!r} 永远不会触发")
+
+    def __str__(self):
+        return self.expression
+
+
+@dataclass
+class DaemonSettings:
+    """Resident mode settings (``daemon`` section of the config)."""
+
+    schedule: str = "0 8 * * *"  # cron expression, Asia/Shanghai time
+    jitter: float = 600.0  # each pass starts up to this many seconds after its cron time
+    poll: float = 5.0  # seconds between config file checks
+    run_on_start: bool = False  # run one pass right away
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        return cls(
+            schedule=str(conf.get("schedule") or cls.schedule),
+            jitter=max(0.0, float(conf.get("jitter", cls.jitter))),
+            poll=max(0.5, float(conf.get("poll", cls.poll))),
+            run_on_start=bool(conf.get("run_on_start", cls.run_on_start)),
+        )
+
+
+class ConfigWatcher:
+    """Polls a file's mtime and size; ``changed()`` is true once per modification."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._stamp = self._read()
+
+    def _read(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self) -> bool:
+        stamp = self._read()
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        return True
+
+
+async def run_daemon(
+    settings: DaemonSettings, run_pass, reload=None, watcher: ConfigWatcher = None, idle=None
+):
+    """
+    Awaits ``run_pass()`` at every cron time plus jitter until SIGTERM/SIGINT.
+
+    Between passes the ``watcher`` is polled; on a change ``reload()`` is
+    awaited and may return new DaemonSettings. ``idle()``, if given, is awaited
+    on every poll tick (deferred work such as queued notifications). A signal
+    during a pass lets it finish first; a second signal cancels it.
+    """
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    current = None
+
+    def on_signal():
+        if stop.is_set() and current is not None:
+            logger.warning("再次收到退出信号，取消当前任务")
+            current.cancel()
+        elif current is not None:
+            logger.info("收到退出信号，当前任务完成后退出")
+        stop.set()
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, on_signal)
+        except (NotImplementedError, RuntimeError):  # Windows
+            signal.signal(signum, lambda *_: loop.call_soon_threadsafe(on_signal))
+
+    schedule = CronSchedule(settings.schedule)
+    due = datetime.now(SHANGHAI) if settings.run_on_start else None
+    try:
+        while not stop.is_set():
+            if due is None:
+                fire = schedule.next_after(datetime.now(SHANGHAI))
+                due = fire + timedelta(seconds=random.uniform(0, settings.jitter))
+                logger.info(f"下一次签到时间: {due.strftime('%Y-%m-%d %H:%M:%S')}（北京时间，计划 {schedule}）")
+
+            wait = (due - datetime.now(SHANGHAI)).total_seconds()
+            if wait > 0:
+                try:
+                    await asyncio.wait_for(stop.wait(), min(wait, settings.poll))
+                except asyncio.TimeoutError:
+                    pass
+                if stop.is_set():
+                    break
+                if watcher is not None and reload is not None and watcher.changed():
+                    logger.info(f"检测到配置文件 {watcher.path} 已修改，正在重新加载……")
+                    try:
+                        new_settings = await reload()
+                        if new_settings is not None and new_settings.schedule != settings.schedule:
+                            schedule = CronSchedule(new_settings.schedule)
+                            due = None
+                    except Exception as e:
+                        logger.error(f"重新加载配置失败，继续使用原配置: {e}")
+                        new_settings = None
+                    settings = new_settings or settings
+                if idle is not None:
+                    try:
+                        await idle()
+                    except Exception as e:
+                        logger.warning(f"后台任务出错: {e}")
+                continue
+
+            due = None
+            current = asyncio.create_task(run_pass())
+            try:
+                await current
+            except asyncio.CancelledError:
+                if not stop.is_set():
+                    raise
+            except Exception as e:
+                logger.exception(f"本次签到任务出错: {e}")
+            finally:
+                current = None
+    finally:
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.remove_signal_handler(signum)
+            except (NotImplementedError, RuntimeError):
+                pass
+    logger.info("守护进程已退出")
@@ -0,0 +1,83 @@
+import os
+import random
+import time
+
+
+def budget_from_context(context, default: float = 900.0) -> float:
+    """
+    Returns the invocation's time budget in seconds.
+
+    Understands the Tencent SCF context (``time_limit_in_ms``), contexts that
+    expose ``get_remaining_time_in_millis()``, and the ``MHYY_TIME_BUDGET``
+    environment variable (seconds), in that order.
+    """
+    if isinstance(context, dict) and context.get("time_limit_in_ms"):
+        return float(context["time_limit_in_ms"]) / 1000
+    remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if callable(remaining):
+        return float(remaining()) / 1000
+    try:
+        return float(os.environ.get("MHYY_TIME_BUDGET", default))
+    except ValueError:
+        return default
+
+
+class Deadline:
+    """Tracks how much of the execution budget is left, keeping ``margin`` seconds in reserve."""
+
+    def __init__(self, budget: float, margin: float = 3.0, started: float = None):
+        self.started = time.monotonic() if started is None else started
+        self.expires = self.started + budget
+        self.margin = margin
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - self.margin - time.monotonic())
+
+    def timeout(self, cap: float) -> float:
+        """Per-request timeout: ``cap``, shortened to what is left of the budget."""
+        return max(0.1, min(cap, self.remaining()))
+
+    def allows(self, seconds: float) -> bool:
+        return self.remaining() >= seconds
+
+
+class JitterSchedule:
+    """
+    Spreads ``count`` accounts over a ``window``-second jitter window.
+
+    Every account gets a random start offset; an account starts at its offset
+    or as soon as the previous one finishes, whichever is later. Time spent
+    working counts towards the window, so nothing is slept up front and only
+    the part of a slot not already covered by work is waited out. The window
+    is shrunk to leave ``reserve`` seconds per account within the deadline.
+    """
+
+    def __init__(self, count: int, window: float, deadline: Deadline, reserve: float = 5.0):
+        usable = max(0.0, deadline.remaining() - count * reserve)
+        self.window = max(0.0, min(window, usable))
+        self.deadline = deadline
+        self.offsets = sorted(random.uniform(0, self.window) for _ in range(count))
+
+    def delay(self, position: int) -> float:
+        """Seconds to wait before the account at ``position`` (0-based) may start."""
+        if position >= len(self.offsets):
+            return 0.0
+        return max(0.0, self.offsets[position] - self.deadline.elapsed())
+
+
+class DurationEstimate:
+    """Running estimate of how long one account takes, used to decide whether another fits."""
+
+    def __init__(self, initial: float = 5.0, weight: float = 0.3):
+        self.value = initial
+        self.weight = weight
+        self._seen = False
+
+    def update(self, seconds: float):
+        if not self._seen:
+            self.value, self._seen = seconds, True
+        else:
+            self.value = self.weight * seconds + (1 - self.weight) * self.value
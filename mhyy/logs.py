@@ -0,0 +1,151 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s]: %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# (account index, buffered records or None) of the account the current task works on
+_account = contextvars.ContextVar("mhyy_account", default=None)
+
+_pipeline = None
+
+
+@dataclass
+class LogSettings:
+    """
+    Logging setup, read from the environment because it is in place before the
+    config: MHYY_LOGLEVEL, MHYY_LOG_FORMAT (text / json) and MHYY_LOG_BUFFER.
+    """
+
+    level: int = logging.INFO
+    format: str = "text"  # json: one compact object per line
+    buffer_accounts: bool = False  # write each account's lines together once it is done
+
+    @classmethod
+    def from_env(cls, environ):
+        level = environ.get("MHYY_LOGLEVEL", "").upper()
+        log_format = environ.get("MHYY_LOG_FORMAT", "").lower()
+        return cls(
+            level=getattr(logging, level) if level in ("DEBUG", "WARNING", "ERROR") else cls.level,
+            format=log_format if log_format in ("text", "json") else cls.format,
+            buffer_accounts=environ.get("MHYY_LOG_BUFFER", "").lower() in ("1", "true", "yes"),
+        )
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, account (if any) and message."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        account = getattr(record, "account", None)
+        if account is not None:
+            entry["account"] = account
+        entry["message"] = record.getMessage()
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+class AccountQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread. Records logged while an account block
+    is open are held back and queued together when the block closes.
+    """
+
+    def emit(self, record):
+        current = _account.get()
+        try:
+            if current is not None:
+                record.account = current[0]
+            record = self.prepare(record)
+        except Exception:
+            self.handleError(record)
+            return
+        if current is not None and current[1] is not None:
+            current[1].append(record)
+        else:
+            self.enqueue(record)
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """A QueueListener that also takes a list of records and writes them back to back."""
+
+    def handle(self, record):
+        if isinstance(record, list):
+            for item in record:
+                super().handle(item)
+        else:
+            super().handle(record)
+
+
+class LogPipeline:
+    """
+    Root handler -> in-memory queue -> one background thread that formats and
+    writes to stderr, so the event loop never waits on the terminal.
+    """
+
+    def __init__(self, settings: LogSettings):
+        self.settings = settings
+        self.queue = queue.SimpleQueue()
+        stream = logging.StreamHandler()
+        if settings.format == "json":
+            stream.setFormatter(JsonFormatter())
+        else:
+            stream.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+        self.handler = AccountQueueHandler(self.queue)
+        self.listener = BatchQueueListener(self.queue, stream)
+
+    def start(self):
+        root = logging.getLogger()
+        root.setLevel(self.settings.level)
+        root.addHandler(self.handler)
+        self.listener.start()
+
+    def stop(self):
+        """Writes out everything queued so far and stops the writer thread."""
+        if self.listener._thread is not None:
+            self.listener.stop()
+        logging.getLogger().removeHandler(self.handler)
+
+
+def setup_logging(settings: LogSettings) -> LogPipeline:
+    """Installs the background log pipeline on the root logger; it is drained at exit."""
+    global _pipeline
+    if _pipeline is not None:
+        _pipeline.stop()
+    _pipeline = LogPipeline(settings)
+    _pipeline.start()
+    atexit.register(_pipeline.stop)
+    return _pipeline
+
+
+def flush_logging():
+    """Drains the pipeline now, e.g. before ``os._exit``."""
+    if _pipeline is not None:
+        _pipeline.stop()
+
+
+@contextmanager
+def account_logs(index):
+    """
+    Tags the records logged inside with the account ``index`` (the json format
+    shows it) and, with MHYY_LOG_BUFFER, writes them as one uninterrupted block
+    when the account is done. Tasks created inside inherit the block.
+    """
+    buffer = [] if _pipeline is not None and _pipeline.settings.buffer_accounts else None
+    token = _account.set((index, buffer))
+    try:
+        yield
+    finally:
+        _account.reset(token)
+        if buffer:
+            _pipeline.queue.put(buffer)
@@ -0,0 +1,214 @@
+import bisect
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .cache import write_text
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# name -> (type, help); only these names are rendered
+METRICS = {
+    "mhyy_request_duration_seconds": ("histogram", "Latency of one HTTP attempt by endpoint."),
+    "mhyy_requests_total": ("counter", "HTTP attempts by endpoint and status code (or error)."),
+    "mhyy_api_retcode_total": ("counter", "Cloud-game API retcodes by endpoint."),
+    "mhyy_account_duration_seconds": ("histogram", "Time spent checking one account."),
+    "mhyy_accounts_total": ("counter", "Processed accounts by sign-in classification."),
+    "mhyy_notifications_total": ("counter", "Notification deliveries by channel and result."),
+    "mhyy_startup_seconds": ("gauge", "Seconds from the start of the last run to the end of each startup phase."),
+    "mhyy_run_duration_seconds": ("gauge", "Wall-clock duration of the last run."),
+    "mhyy_run_finished_timestamp_seconds": ("gauge", "Unix time the last run finished."),
+}
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple, extra: str = None) -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms kept in process and rendered in the
+    Prometheus text exposition format. Updates are cheap dict operations under
+    a lock, so the sync (scf, background threads) and async paths can share one.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}  # (name, labels) -> counter / gauge value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            state = self._histograms.get(key)
+            if state is None:
+                state = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[bisect.bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+
+    # --- helpers for the instrumented call sites ---
+
+    def request(self, endpoint: str, upstream: str, status, seconds: float):
+        """One HTTP attempt; ``status`` is the status code or "error"."""
+        self.observe("mhyy_request_duration_seconds", seconds, endpoint=endpoint, upstream=upstream)
+        self.inc("mhyy_requests_total", endpoint=endpoint, upstream=upstream, status=status)
+
+    def retcode(self, endpoint: str, retcode):
+        self.inc("mhyy_api_retcode_total", endpoint=endpoint, retcode=retcode)
+
+    def account(self, sign_in: str, seconds: float):
+        self.observe("mhyy_account_duration_seconds", seconds)
+        self.inc("mhyy_accounts_total", sign_in=sign_in)
+
+    def notification(self, channel: str, ok: bool):
+        self.inc("mhyy_notifications_total", channel=channel, result="ok" if ok else "failed")
+
+    def histogram_totals(self, name: str) -> dict:
+        """``{labels: (count, sum)}`` of every series of histogram ``name``."""
+        with self._lock:
+            return {
+                labels: (sum(state[:-1]), state[-1])
+                for (metric, labels), state in self._histograms.items()
+                if metric == name
+            }
+
+    def render(self) -> str:
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: list(state) for key, state in self._histograms.items()}
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            source = histograms if kind == "histogram" else values
+            series = sorted(
+                (labels, value) for (metric, labels), value in source.items() if metric == name
+            )
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in series:
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), value[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    bucket = 'le="' + le + '"'
+                    lines.append(f"{name}_bucket{_labels(labels, bucket)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+class PhaseTimer:
+    """
+    Records when each startup phase ended, in seconds since ``origin`` (a
+    ``time.perf_counter()`` value, default now). Phases that overlap simply
+    end in whatever order they finish; the first mark of a phase wins.
+    """
+
+    def __init__(self, origin: float = None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.phases = {}
+
+    def mark(self, phase: str, at: float = None):
+        if phase not in self.phases:
+            self.phases[phase] = (time.perf_counter() if at is None else at) - self.origin
+
+    def report(self, metrics: Metrics, labels: dict = None):
+        """Sets the gauges and logs one line, naming phases with ``labels`` where given."""
+        labels = labels or {}
+        for phase, seconds in self.phases.items():
+            metrics.set("mhyy_startup_seconds", seconds, phase=phase)
+        if self.phases:
+            logger.info(
+                "启动耗时："
+                + "，".join(
+                    f"{labels.get(phase, phase)} {seconds:.3f}s"
+                    for phase, seconds in sorted(self.phases.items(), key=lambda item: item[1])
+                )
+            )
+
+
+@dataclass
+class MetricsSettings:
+    """Metrics export (``metrics`` section of the config)."""
+
+    textfile: str = None  # Prometheus textfile written at the end of a run
+    port: int = None  # serve /metrics on this port while running
+    host: str = "127.0.0.1"
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        port = conf.get("port")
+        return cls(
+            textfile=conf.get("textfile") or None,
+            port=int(port) if port else None,
+            host=conf.get("host") or cls.host,
+        )
+
+
+def write_textfile(metrics: Metrics, path: str):
+    """Writes the metrics atomically, as the node_exporter textfile collector expects."""
+    try:
+        write_text(path, metrics.render())
+    except OSError as e:
+        logger.warning(f"无法写入指标文件 {path}: {e}")
+
+
+def serve(metrics: Metrics, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves ``GET /metrics`` from a daemon thread; call ``shutdown()`` on the result to stop."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics endpoint: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mhyy-metrics", daemon=True).start()
+    logger.info(f"指标接口已启动: http://{host}:{server.server_address[1]}/metrics")
+    return server
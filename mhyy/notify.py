@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from .clients import ClientRegistry
+from .metrics import Metrics
+from .runner import ACCOUNT_SEPARATOR, MESSAGE_HEADER
+
+logger = logging.getLogger(__name__)
+
+# name -> Channel subclass, filled in by Channel.__init_subclass__
+CHANNELS = {}
+
+
+class NotificationError(Exception):
+    """Raised by a channel when the service answers but rejects the message."""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+@dataclass
+class DeliveryResult:
+    """Outcome of delivering one message to one channel."""
+
+    channel: str
+    ok: bool
+    attempts: int
+    elapsed: float
+    error: str = None
+
+
+class Channel:
+    """
+    Base class for notification channels. Subclasses set ``name`` (the key in
+    the ``notifications`` config section), the config keys they require and
+    their message-size limit, and implement ``send`` which raises on failure.
+    Defining a subclass is enough to register it.
+    """
+
+    name = None
+    label = None
+    required = ()
+    limit = 4096  # longest message (in characters) the channel accepts in one push
+    rate = None  # pushes per second the service tolerates, None for the outbox default
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.name:
+            CHANNELS[cls.name] = cls
+
+    def __init__(self, conf: dict):
+        self.conf = conf
+
+    @classmethod
+    def from_settings(cls, settings: dict):
+        conf = settings.get(cls.name) or {}
+        if all(conf.get(key) for key in cls.required):
+            return cls(conf)
+        logger.debug("%s not configured.", cls.label)
+        return None
+
+    async def send(self, message: str, registry: ClientRegistry):
+        raise NotImplementedError
+
+
+class ServerChan(Channel):
+    name = "serverchan"
+    label = "ServerChan"
+    required = ("key",)
+    limit = 10000
+
+    async def send(self, message, registry):
+        sct_url = f"https://sctapi.ftqq.com/{self.conf['key']}.send"
+        payload = {"title": "MHYY-AutoCheckin 状态推送", "desp": message}
+        response = await registry.get("serverchan").get(sct_url, params=payload)
+        response.raise_for_status()
+
+
+class DingTalk(Channel):
+    name = "dingtalk"
+    label = "DingTalk"
+    required = ("webhook_url",)
+    limit = 6000
+    rate = 20 / 60  # a robot may post 20 messages a minute
+
+    async def send(self, message, registry):
+        payload = {"msgtype": "text", "text": {"content": message}}
+        response = await registry.get("dingtalk").post(
+            self.conf["webhook_url"], json=payload
+        )
+        response.raise_for_status()
+        result = response.json()
+        if result.get("errcode") != 0:
+            # 130101: too many messages per minute, worth another try later
+            raise NotificationError(
+                f"{result.get('errcode')} - {result.get('errmsg')}",
+                retryable=result.get("errcode") == 130101,
+            )
+
+
+class PushPlus(Channel):
+    name = "pushplus"
+    label = "PushPlus"
+    required = ("key",)
+    limit = 10000
+
+    async def send(self, message, registry):
+        sct_url = f"http://www.pushplus.plus/send/{self.conf['key']}"
+        payload = {"title": "MHYY-AutoCheckin 状态推送", "content": message}
+        response = await registry.get("pushplus").post(sct_url, data=payload)
+        response.raise_for_status()
+
+
+class Telegram(Channel):
+    name = "telegram"
+    label = "Telegram"
+    required = ("bot_token", "chat_id")
+    limit = 4096
+
+    async def send(self, message, registry):
+        telegram_url = f"https://api.telegram.org/bot{self.conf['bot_token']}/sendMessage"
+        # Telegram text message parameters
+        params = {
+            "chat_id": self.conf["chat_id"],
+            "text": message,
+            # Optional: parse_mode can be 'MarkdownV2', 'HTML', or None
+            # For simplicity, sending as plain text. Be careful with special characters if using Markdown/HTML.
+            # "parse_mode": "HTML"
+        }
+        logger.debug("Proxy settings: %s", registry.proxy)
+        response = await registry.get("telegram").get(telegram_url, params=params)
+        response.raise_for_status()  # Raise an exception for bad status codes
+        result = response.json()
+        logger.debug("Telegram response: %s", result)
+        if not result.get("ok"):
+            raise NotificationError(
+                f"{result.get('error_code')} - {result.get('description')}"
+            )
+
+
+def build_digests(blocks, limit: int, header: str = MESSAGE_HEADER) -> list:
+    """
+    Packs per-account blocks into as few messages as possible, each no longer
+    than ``limit`` characters. Blocks are never split unless a single block is
+    itself too long for the channel.
+    """
+    messages = []
+    current = ""
+    room = max(1, limit - len(header))
+    for block in blocks:
+        block = block.strip("\n") + "\n"
+        pieces = [block[i : i + room] for i in range(0, len(block), room)]
+        for piece in pieces:
+            if current and len(current) + len(ACCOUNT_SEPARATOR) + len(piece) > room:
+                messages.append(header + current)
+                current = ""
+            current = current + ACCOUNT_SEPARATOR + piece if current else piece
+    if current:
+        messages.append(header + current)
+    return messages
+
+
+@dataclass
+class DispatchOptions:
+    """
+    Delivery policy, read from the ``notifications`` section. Each channel
+    section may override ``timeout`` and ``retries`` for that channel.
+    """
+
+    timeout: float = 10.0  # per attempt
+    retries: int = 2  # extra attempts after the first failure
+    backoff: float = 1.0  # base delay, doubled on every retry
+    max_backoff: float = 30.0
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        return cls(
+            timeout=float(conf.get("timeout", cls.timeout)),
+            retries=max(0, int(conf.get("retries", cls.retries))),
+            backoff=float(conf.get("backoff", cls.backoff)),
+            max_backoff=float(conf.get("max_backoff", cls.max_backoff)),
+        )
+
+    def for_channel(self, conf: dict):
+        return DispatchOptions(
+            timeout=float(conf.get("timeout", self.timeout)),
+            retries=max(0, int(conf.get("retries", self.retries))),
+            backoff=self.backoff,
+            max_backoff=self.max_backoff,
+        )
+
+    def delay(self, attempt: int) -> float:
+        """Jittered exponential backoff before retry number ``attempt`` (1-based)."""
+        ceiling = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, NotificationError):
+        return error.retryable
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (httpx.RequestError, asyncio.TimeoutError))
+
+
+def _describe(channel: Channel, error: Exception) -> str:
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"{channel.label} HTTP error occurred: {error.response.status_code} - {error.response.text}"
+    if isinstance(error, httpx.RequestError):
+        return f"An error occurred while requesting {channel.label}: {error}"
+    if isinstance(error, asyncio.TimeoutError):
+        return f"{channel.label} timed out"
+    if isinstance(error, NotificationError):
+        return f"{channel.label} error: {error}"
+    return f"An unexpected error occurred sending {channel.label} notification: {error}"
+
+
+class Dispatcher:
+    """Sends messages to every configured channel concurrently."""
+
+    def __init__(self, settings: dict, registry: ClientRegistry, metrics: Metrics = None):
+        settings = settings or {}
+        self.registry = registry
+        self.metrics = metrics or Metrics()
+        self.options = DispatchOptions.from_config(settings)
+        self.channels = [
+            channel
+            for channel in (cls.from_settings(settings) for cls in CHANNELS.values())
+            if channel is not None
+        ]
+
+    async def deliver(self, channel: Channel, message: str) -> DeliveryResult:
+        """Sends ``message`` to one channel, retrying transient failures."""
+        options = self.options.for_channel(channel.conf)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            attempt_started = time.monotonic()
+            try:
+                await asyncio.wait_for(
+                    channel.send(message, self.registry), options.timeout
+                )
+                self.metrics.request(
+                    channel.name, channel.name, "ok", time.monotonic() - attempt_started
+                )
+                self.metrics.notification(channel.name, True)
+                logger.info("%s notification sent successfully.", channel.label)
+                return DeliveryResult(
+                    channel.name, True, attempt, time.monotonic() - started
+                )
+            except Exception as e:
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else "error"
+                self.metrics.request(
+                    channel.name, channel.name, status, time.monotonic() - attempt_started
+                )
+                error = _describe(channel, e)
+                if attempt > options.retries or not _is_retryable(e):
+                    logger.error(error)
+                    self.metrics.notification(channel.name, False)
+                    return DeliveryResult(
+                        channel.name, False, attempt, time.monotonic() - started, error
+                    )
+                delay = options.delay(attempt)
+                logger.warning("%s; retrying in %.1fs (%s/%s)", error, delay, attempt, options.retries)
+                await asyncio.sleep(delay)
+
+    async def _deliver_all(self, channel: Channel, messages: list) -> list:
+        return [await self.deliver(channel, message) for message in messages]
+
+    async def dispatch(self, message: str) -> list:
+        """Sends ``message`` to all channels; returns one DeliveryResult per channel."""
+        if not message or not self.channels:
+            logger.debug("No message to send or no notification settings configured.")
+            return []
+
+        logger.info("Attempting to send notifications...")
+        return list(
+            await asyncio.gather(
+                *(self.deliver(channel, message) for channel in self.channels)
+            )
+        )
+
+    async def dispatch_digest(self, blocks: list) -> list:
+        """
+        Sends the collected account blocks as a digest, split per channel
+        limit. Channels run concurrently; the parts of one channel go in order.
+        """
+        if not blocks or not self.channels:
+            logger.debug("No message to send or no notification settings configured.")
+            return []
+
+        logger.info("Attempting to send a digest of %s account(s)...", len(blocks))
+        per_channel = await asyncio.gather(
+            *(
+                self._deliver_all(channel, build_digests(blocks, channel.limit))
+                for channel in self.channels
+            )
+        )
+        return [result for results in per_channel for result in results]
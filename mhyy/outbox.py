@@ -0,0 +1,344 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+
+from .cache import cache_path
+from .notify import Dispatcher, build_digests
+from .ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,        -- mhyy.notify channel name
+    digest TEXT NOT NULL,         -- sha256 of the message, for deduplication
+    message TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_at REAL NOT NULL,        -- not tried again before this unix time
+    last_error TEXT,
+    sent_at REAL                  -- NULL while pending
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (channel, sent_at, next_at);
+CREATE INDEX IF NOT EXISTS outbox_digest ON outbox (channel, digest);
+"""
+
+
+def message_digest(message: str) -> str:
+    return hashlib.sha256(message.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class OutboxSettings:
+    """Notification spool settings (``outbox`` section of the config)."""
+
+    enabled: bool = True
+    path: str = None  # defaults to <cache dir>/outbox.db
+    batch: int = 20  # messages fetched per channel per round
+    rate: float = 1.0  # pushes per second per channel, unless the channel sets its own
+    burst: float = 3.0
+    retry_after: float = 60.0  # first deferral after a failed delivery, doubled up to an hour
+    max_attempts: int = 10  # failed deliveries before a message is dropped
+    max_age: float = 3 * 86400.0  # pending messages older than this are dropped
+    drain_timeout: float = 60.0  # longest wait at the end of a run, 0 waits for everything
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        return cls(
+            enabled=bool(conf.get("enabled", cls.enabled)),
+            path=conf.get("path") or cache_path("outbox.db"),
+            batch=max(1, int(conf.get("batch", cls.batch))),
+            rate=float(conf.get("rate", cls.rate)),
+            burst=float(conf.get("burst", cls.burst)),
+            retry_after=max(0.0, float(conf.get("retry_after", cls.retry_after))),
+            max_attempts=max(1, int(conf.get("max_attempts", cls.max_attempts))),
+            max_age=float(conf.get("max_age", cls.max_age)),
+            drain_timeout=max(0.0, float(conf.get("drain_timeout", cls.drain_timeout))),
+        )
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(3600.0, self.retry_after * 2 ** max(0, attempts - 1))
+
+
+class Outbox:
+    """
+    Durable per-channel queue of notification messages in SQLite. A message is
+    stored once per channel so every channel retries on its own; delivered
+    rows are purged.
+    """
+
+    def __init__(self, path: str, settings: OutboxSettings = None):
+        self.path = path
+        self.settings = settings or OutboxSettings(path=path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def enqueue(self, channel: str, message: str, now: float = None):
+        """
+        Queues ``message`` for ``channel``; returns the row id, or None if the
+        same message is still pending there. Delivered messages never count.
+        """
+        now = time.time() if now is None else now
+        digest = message_digest(message)
+        with self._conn:
+            duplicate = self._conn.execute(
+                "SELECT 1 FROM outbox WHERE channel = ? AND digest = ? AND sent_at IS NULL LIMIT 1",
+                (channel, digest),
+            ).fetchone()
+            if duplicate:
+                return None
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (channel, digest, message, created_at, next_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (channel, digest, message, now, now),
+            )
+        return cursor.lastrowid
+
+    def due(self, channel: str, limit: int, now: float = None) -> list:
+        """The oldest pending ``(id, message, attempts)`` of ``channel`` that may be tried now."""
+        now = time.time() if now is None else now
+        return self._conn.execute(
+            "SELECT id, message, attempts FROM outbox"
+            " WHERE channel = ? AND sent_at IS NULL AND next_at <= ? ORDER BY id LIMIT ?",
+            (channel, now, limit),
+        ).fetchall()
+
+    def has_due(self, channels, now: float = None) -> bool:
+        now = time.time() if now is None else now
+        channels = list(channels)
+        if not channels:
+            return False
+        marks = ",".join("?" * len(channels))
+        row = self._conn.execute(
+            f"SELECT 1 FROM outbox WHERE channel IN ({marks})"
+            " AND sent_at IS NULL AND next_at <= ? LIMIT 1",
+            (*channels, now),
+        ).fetchone()
+        return row is not None
+
+    def mark_sent(self, row_id: int, now: float = None):
+        with self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET sent_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (time.time() if now is None else now, row_id),
+            )
+
+    def mark_failed(self, row_id: int, attempts: int, error: str, now: float = None) -> bool:
+        """Defers the row after a failed delivery; returns False if it was dropped instead."""
+        now = time.time() if now is None else now
+        with self._conn:
+            if attempts >= self.settings.max_attempts:
+                self._conn.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+                return False
+            self._conn.execute(
+                "UPDATE outbox SET attempts = ?, last_error = ?, next_at = ? WHERE id = ?",
+                (attempts, error, now + self.settings.retry_delay(attempts), row_id),
+            )
+        return True
+
+    def retry_now(self, now: float = None):
+        """Makes every pending row due again, e.g. at the start of a new run."""
+        with self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET next_at = ? WHERE sent_at IS NULL",
+                (time.time() if now is None else now,),
+            )
+
+    def purge(self, now: float = None) -> int:
+        """Forgets delivered rows; returns how many pending rows expired."""
+        now = time.time() if now is None else now
+        with self._conn:
+            self._conn.execute("DELETE FROM outbox WHERE sent_at IS NOT NULL")
+            expired = self._conn.execute(
+                "DELETE FROM outbox WHERE sent_at IS NULL AND created_at < ?",
+                (now - self.settings.max_age,),
+            ).rowcount
+        return expired
+
+    def pending(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE sent_at IS NULL").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_outbox(settings: OutboxSettings):
+    """Opens the outbox, or returns None (direct delivery) when disabled or unavailable."""
+    if not settings.enabled:
+        return None
+    try:
+        return Outbox(settings.path, settings)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("无法打开推送队列 %s，将直接推送: %s", settings.path, e)
+        return None
+
+
+class QueuedDispatcher:
+    """
+    Stands in for Dispatcher: ``dispatch`` and ``dispatch_digest`` only spool
+    the messages, so the account loop never waits on a webhook. A background
+    task delivers them in batches, one token bucket per channel; whatever
+    fails stays queued for the next round, run or daemon tick.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, outbox: Outbox):
+        self.dispatcher = dispatcher
+        self.outbox = outbox
+        self.settings = outbox.settings
+        self.buckets = {}
+        for channel in dispatcher.channels:
+            rate = float(channel.conf.get("rate") or channel.rate or self.settings.rate)
+            burst = float(channel.conf.get("burst", self.settings.burst))
+            self.buckets[channel.name] = TokenBucket(rate, burst) if rate > 0 else None
+        self._wake = asyncio.Event()
+        self._direct = set()  # direct pushes after a failed enqueue, awaited by close()
+        self._unsent = {}  # row id -> (channel, message) spooled by this dispatcher, not yet sent
+        self._worker = None
+        self._closing = False
+
+    def _enqueue(self, channel, message: str):
+        try:
+            row_id = self.outbox.enqueue(channel.name, message)
+            if row_id is None:
+                logger.info("%s 已有相同的推送消息，跳过重复消息", channel.label)
+            else:
+                self._unsent[row_id] = (channel, message)
+        except sqlite3.Error as e:
+            # The queue is unusable; fall back to a direct push in the background
+            logger.warning("写入推送队列失败，直接推送: %s", e)
+            task = asyncio.ensure_future(self.dispatcher.deliver(channel, message))
+            self._direct.add(task)
+            task.add_done_callback(self._direct.discard)
+
+    async def dispatch(self, message: str):
+        if not message or not self.dispatcher.channels:
+            return
+        for channel in self.dispatcher.channels:
+            self._enqueue(channel, message)
+        self._wake.set()
+
+    async def dispatch_digest(self, blocks: list):
+        if not blocks or not self.dispatcher.channels:
+            return
+        for channel in self.dispatcher.channels:
+            for message in build_digests(blocks, channel.limit):
+                self._enqueue(channel, message)
+        self._wake.set()
+
+    async def _drain_channel(self, channel) -> int:
+        """Delivers the due messages of one channel; returns how many were sent."""
+        bucket = self.buckets.get(channel.name)
+        sent = 0
+        while True:
+            rows = self.outbox.due(channel.name, self.settings.batch)
+            if not rows:
+                return sent
+            for row_id, message, attempts in rows:
+                if bucket is not None:
+                    await bucket.acquire()
+                result = await self.dispatcher.deliver(channel, message)
+                if result.ok:
+                    self._unsent.pop(row_id, None)
+                    self.outbox.mark_sent(row_id)
+                    sent += 1
+                elif not self.outbox.mark_failed(row_id, attempts + 1, result.error):
+                    self._unsent.pop(row_id, None)
+                    logger.error("%s 推送连续失败 %s 次，已放弃该消息", channel.label, attempts + 1)
+
+    async def flush(self) -> int:
+        """Delivers everything currently due on every channel; returns how many were sent."""
+        expired = self.outbox.purge()
+        if expired:
+            logger.warning("推送队列中 %s 条消息超过保留时间仍未送达，已丢弃", expired)
+        if not self.outbox.has_due(self.buckets):
+            return 0
+        sent = await asyncio.gather(
+            *(self._drain_channel(channel) for channel in self.dispatcher.channels)
+        )
+        return sum(sent)
+
+    async def _run(self):
+        while not self._closing:
+            await self._wake.wait()
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning("推送队列投递出错: %s", e)
+
+    def start(self):
+        """Starts background delivery; messages left over from earlier runs go first."""
+        if self._worker is None:
+            try:
+                self.outbox.retry_now()
+            except sqlite3.Error as e:
+                logger.warning("读取推送队列失败: %s", e)
+            self._worker = asyncio.ensure_future(self._run())
+            self._wake.set()
+
+    async def _deliver_unsent(self):
+        """Pushes the messages spooled by this dispatcher directly, bypassing the outbox."""
+        unsent, self._unsent = list(self._unsent.values()), {}
+        await asyncio.gather(
+            *(self.dispatcher.deliver(channel, message) for channel, message in unsent)
+        )
+
+    async def _drain(self) -> bool:
+        """Lets the background delivery finish; returns False if the outbox failed meanwhile."""
+        if self._worker is not None:
+            self._closing = True
+            self._wake.set()
+            await self._worker
+            self._worker = None
+        if self._direct:
+            await asyncio.gather(*self._direct)
+        try:
+            await self.flush()
+        except sqlite3.Error as e:
+            logger.warning("读取推送队列失败，直接推送本次的 %s 条消息: %s", len(self._unsent), e)
+            await self._deliver_unsent()
+            return False
+        return True
+
+    async def close(self):
+        """
+        Waits up to ``drain_timeout`` for the background delivery to catch up
+        with everything queued so far; what is left stays queued for the next
+        run or daemon tick. If the outbox fails now, this run's messages are
+        pushed from memory instead.
+        """
+        timeout = self.settings.drain_timeout or None
+        try:
+            if not await asyncio.wait_for(self._drain(), timeout):
+                return
+        except asyncio.TimeoutError:
+            # wait_for has cancelled the delivery; undelivered rows are still pending
+            self._worker = None
+            if self._direct:
+                logger.warning("推送队列不可用，%s 条直接推送的消息未能在 %g 秒内送达", len(self._direct), timeout)
+            logger.warning("推送队列在 %g 秒内未投递完，剩余消息留在队列中，将在下次运行时重试", timeout)
+            return
+        try:
+            pending = self.outbox.pending()
+        except sqlite3.Error as e:
+            logger.warning("读取推送队列失败: %s", e)
+            return
+        if pending:
+            logger.warning("推送队列中还有 %s 条消息未送达，将在下次运行时重试", pending)
@@ -0,0 +1,162 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+_BBSID_RE = re.compile(r"oi=(\d+)")
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (iPhone; CPU iPhone OS {sysver} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148"
+
+# Fields scf.py insists on; main.py fills in defaults instead
+STRICT_FIELDS = ("token", "type", "sysver", "deviceid", "devicename", "devicemodel", "appid")
+
+
+@dataclass(frozen=True, slots=True)
+class Endpoints:
+    """API endpoints of one region."""
+
+    client: str  # upstream name in ClientRegistry
+    host: str
+    label: str  # CN / GLOBAL, as shown in logs and messages
+    wallet: str
+    announcement: str
+    notification: str
+
+
+ENDPOINTS = {
+    "cn": Endpoints(
+        client="cn",
+        host="api-cloudgame.mihoyo.com",
+        label="CN",
+        wallet="https://api-cloudgame.mihoyo.com/hk4e_cg_cn/wallet/wallet/get",
+        announcement="https://api-cloudgame.mihoyo.com/hk4e_cg_cn/gamer/api/getAnnouncementInfo",
+        notification="https://api-cloudgame.mihoyo.com/hk4e_cg_cn/gamer/api/listNotifications?status=NotificationStatusUnread&type=NotificationTypePopup&is_sort=true",
+    ),
+    "os": Endpoints(
+        client="os",
+        host="sg-cg-api.hoyoverse.com",
+        label="GLOBAL",
+        wallet="https://sg-cg-api.hoyoverse.com/hk4e_global/cg/wallet/wallet/get",
+        announcement="https://sg-cg-api.hoyoverse.com/hk4e_global/cg/gamer/api/getAnnouncementInfo",
+        notification="https://sg-cg-api.hoyoverse.com/hk4e_global/cg/gamer/api/listNotifications?status=NotificationStatusUnread&type=NotificationTypePopup&is_sort=true",
+    ),
+}
+
+# Region-specific header overrides
+_OS_HEADERS = {
+    "x-rpc-channel": "mihoyo",
+    "x-rpc-cg_game_biz": "hk4e_global",
+    "x-rpc-op_biz": "clgm_global",
+    "x-rpc-cg_game_id": "9000254",
+    "x-rpc-app_id": "600493",
+    "User-Agent": "okhttp/4.10.0",
+    "Host": "sg-cg-api.hoyoverse.com",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class AccountProfile:
+    """
+    An account compiled once from its config entry: validated fields, the
+    request headers (all but ``x-rpc-app_version``, which depends on the run)
+    and the endpoint table of its region.
+    """
+
+    index: int  # 1-based position in the account list
+    token: str
+    deviceid: str
+    region: str  # "cn" or "os"
+    bbsid: str
+    endpoints: Endpoints
+    headers: Mapping
+    fingerprint: str  # see account_fingerprint
+
+    def headers_for(self, version: str) -> dict:
+        headers = dict(self.headers)
+        headers["x-rpc-app_version"] = str(version)
+        return headers
+
+
+def account_fingerprint(region: str, deviceid: str, token: str) -> str:
+    """
+    Identifies an account login in persisted state without storing the token.
+    A new token (re-login) gives a new fingerprint.
+    """
+    return hashlib.sha256(f"{region}\0{deviceid}\0{token}".encode()).hexdigest()[:32]
+
+
+@dataclass(frozen=True, slots=True)
+class InvalidAccount:
+    """A config entry that could not be compiled; ``error`` explains why."""
+
+    index: int
+    config: object
+    reason: str  # "invalid" (not a mapping / no token), "missing_key" or "incomplete"
+    error: str
+
+
+def compile_account(index: int, config, strict: bool = False, user_agent: str = None):
+    """
+    Compiles one ``accounts`` entry into an AccountProfile, or an
+    InvalidAccount describing what is wrong with it. With ``strict`` every
+    field in STRICT_FIELDS must be set (scf.py); otherwise the same defaults
+    as main.py are used.
+    """
+    if strict and isinstance(config, dict) and not all(config.get(key) for key in STRICT_FIELDS):
+        return InvalidAccount(index, config, "incomplete", f"第 {index} 个账户配置不完整，请检查配置。")
+    if not isinstance(config, dict) or "token" not in config:
+        return InvalidAccount(index, config, "invalid", f"跳过无效的账号配置条目: {config}")
+
+    try:
+        deviceid = config["deviceid"]
+    except KeyError as e:
+        return InvalidAccount(index, config, "missing_key", f"账号配置缺少必需的键: {e}")
+
+    token = config["token"]
+    sysver = config.get("sysver", "14.0")
+    headers = {
+        "x-rpc-combo_token": token,
+        "x-rpc-client_type": str(config.get("type", 5)),
+        "x-rpc-sys_version": str(sysver),
+        "x-rpc-channel": "cyydmihoyo",
+        "x-rpc-device_id": deviceid,
+        "x-rpc-device_name": config.get("devicename", "iPhone 13"),
+        "x-rpc-device_model": config.get("devicemodel", "iPhone13,3"),
+        "x-rpc-vendor_id": "1",
+        "x-rpc-cg_game_biz": "hk4e_cn",
+        "x-rpc-op_biz": "clgm_cn",
+        "x-rpc-language": "zh-cn",
+        "Host": "api-cloudgame.mihoyo.com",
+        "Connection": "Keep-Alive",
+        "Accept-Encoding": "gzip",
+        "User-Agent": (user_agent or DEFAULT_USER_AGENT).format(sysver=sysver),
+    }
+
+    # Anything other than "os" is treated as CN, as before
+    region = "os" if config.get("region", "cn") == "os" else "cn"
+    if region == "os":
+        headers.update(_OS_HEADERS)
+
+    bbsid_match = _BBSID_RE.search(str(token))
+    return AccountProfile(
+        index=index,
+        token=token,
+        deviceid=deviceid,
+        region=region,
+        bbsid=bbsid_match.group(1) if bbsid_match else "N/A",
+        endpoints=ENDPOINTS[region],
+        headers=MappingProxyType(headers),
+        fingerprint=account_fingerprint(region, deviceid, token),
+    )
+
+
+def iter_profiles(accounts, strict: bool = False, user_agent: str = None):
+    """Lazily compiles the entries of any iterable of account configs; see compile_account."""
+    for index, config in enumerate(accounts or (), start=1):
+        yield compile_account(index, config, strict=strict, user_agent=user_agent)
+
+
+def compile_accounts(accounts, strict: bool = False, user_agent: str = None) -> list:
+    """Compiles every entry of ``accounts``; see compile_account."""
+    return list(iter_profiles(accounts, strict=strict, user_agent=user_agent))
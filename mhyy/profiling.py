@@ -0,0 +1,191 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULT_DIRECTORY = ".mhyy_profile"
+
+# httpcore trace events -> phase names; the stage (started / complete / failed)
+# is split off, so one entry covers HTTP/1.1 and HTTP/2 alike
+TRACE_PHASES = {
+    "connect_tcp": "http.connect_tcp",  # DNS lookup and TCP handshake
+    "start_tls": "http.start_tls",
+    "send_request_headers": "http.send",
+    "send_request_body": "http.send",
+    "receive_response_headers": "http.wait_upstream",  # time to first byte
+    "receive_response_body": "http.receive_body",
+}
+
+
+def requested_directory(argv, environ) -> str:
+    """
+    The report directory asked for by ``--profile [DIR]`` or ``MHYY_PROFILE``
+    (a directory, or 1/true for the default), or None. Read straight from
+    argv so profiling can start before the config is parsed.
+    """
+    for position, arg in enumerate(argv):
+        if arg == "--profile":
+            following = argv[position + 1] if position + 1 < len(argv) else ""
+            return following if following and not following.startswith("-") else DEFAULT_DIRECTORY
+        if arg.startswith("--profile="):
+            return arg.split("=", 1)[1] or DEFAULT_DIRECTORY
+    value = environ.get("MHYY_PROFILE", "")
+    if value.lower() in ("", "0", "false", "no", "off"):
+        return None
+    if value.lower() in ("1", "true", "yes", "on"):
+        return DEFAULT_DIRECTORY
+    return value
+
+
+class Profiler:
+    """
+    One profiled process: cProfile of the event-loop thread, tracemalloc
+    allocation sites and the wall-clock time of named phases, written to a
+    timestamped directory under ``directory`` by ``write()``.
+
+    Nothing here runs unless a Profiler was created; call sites guard on it
+    being None.
+    """
+
+    def __init__(self, directory: str, frames: int = 10):
+        self.directory = os.path.join(directory, datetime.now().strftime("%Y%m%d-%H%M%S"))
+        self.frames = frames
+        self.started = time.perf_counter()
+        self._phases = {}  # name -> [count, total, max]
+        self.startup = {}  # PhaseTimer.phases of the last pass
+        self._lock = threading.Lock()
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        self._profile.enable()
+        return self
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            phase = self._phases.get(name)
+            if phase is None:
+                phase = self._phases[name] = [0, 0.0, 0.0]
+            phase[0] += 1
+            phase[1] += seconds
+            phase[2] = max(phase[2], seconds)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def timed(self, name: str, function):
+        """``function`` wrapped so that every call is added to phase ``name``."""
+
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    def account(self, result):
+        """Adds one AccountResult: its total time and each API call."""
+        self.add("account", result.elapsed)
+        for call, seconds in result.latencies.items():
+            self.add(f"account.{call}", seconds)
+
+    # --- httpx request hooks (ClientRegistry ``trace``) ---
+
+    def _tracer(self):
+        starts = {}
+
+        def on_event(event: str):
+            step, _, stage = event.rpartition(".")
+            step = step.rpartition(".")[2]
+            if stage == "started":
+                starts[step] = time.perf_counter()
+            elif stage in ("complete", "failed") and step in starts and step in TRACE_PHASES:
+                self.add(TRACE_PHASES[step], time.perf_counter() - starts.pop(step))
+
+        return on_event
+
+    def request_hook(self, request):
+        on_event = self._tracer()
+        request.extensions["trace"] = lambda event, info: on_event(event)
+
+    async def async_request_hook(self, request):
+        on_event = self._tracer()
+
+        async def trace(event, info):
+            on_event(event)
+
+        request.extensions["trace"] = trace
+
+    # --- report ---
+
+    def write(self, metrics=None) -> str:
+        """Stops profiling and writes the report; returns its directory."""
+        self._profile.disable()
+        self.add("total", time.perf_counter() - self.started)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Allocations first, before the report itself allocates anything
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                (tracemalloc.Filter(False, tracemalloc.__file__),)
+            )
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(os.path.join(self.directory, "allocations.txt"), "w", encoding="utf-8") as f:
+                f.write(f"current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n")
+                for stat in snapshot.statistics("traceback")[:30]:
+                    f.write(f"{stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+                    for line in stat.traceback.format(limit=self.frames):
+                        f.write(line + "\n")
+                    f.write("\n")
+
+        self._profile.dump_stats(os.path.join(self.directory, "profile.pstats"))
+        text = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=text).strip_dirs()
+        text.write("== by cumulative time ==\n")
+        stats.sort_stats("cumulative").print_stats(50)
+        text.write("\n== by own time ==\n")
+        stats.sort_stats("tottime").print_stats(30)
+        with open(os.path.join(self.directory, "profile.txt"), "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+
+        with self._lock:
+            phases = {
+                name: {"count": count, "total": round(total, 6), "max": round(peak, 6)}
+                for name, (count, total, peak) in sorted(self._phases.items())
+            }
+        report = {"phases": phases}
+        if self.startup:
+            report["startup"] = {name: round(seconds, 6) for name, seconds in self.startup.items()}
+        if metrics is not None:
+            report["requests"] = {
+                " ".join(f"{key}={value}" for key, value in labels): {
+                    "count": count,
+                    "total": round(total, 6),
+                }
+                for labels, (count, total) in metrics.histogram_totals(
+                    "mhyy_request_duration_seconds"
+                ).items()
+            }
+        with open(os.path.join(self.directory, "phases.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(self.directory, "phases.txt"), "w", encoding="utf-8") as f:
+            f.write(f"{'phase':<32}{'count':>8}{'total s':>12}{'max s':>12}\n")
+            for name, phase in sorted(phases.items(), key=lambda item: -item[1]["total"]):
+                f.write(f"{name:<32}{phase['count']:>8}{phase['total']:>12.4f}{phase['max']:>12.4f}\n")
+            for section in ("startup", "requests"):
+                if report.get(section):
+                    f.write(f"\n{section}\n")
+                    for name, value in report[section].items():
+                        f.write(f"  {name}: {value}\n")
+        return self.directory
@@ -0,0 +1,101 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, holding at most ``burst``."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        # The lock makes waiters queue up in order instead of racing for tokens
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class RateLimitSettings:
+    """Request pacing (``ratelimit`` section of the config)."""
+
+    rate: float = 0.0  # requests per second per host, 0 (default) disables pacing
+    burst: float = 5.0
+    spread: float = 2.0  # account start times are spread over this many seconds
+    hosts: dict = field(default_factory=dict)  # per-host {rate, burst} overrides
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        return cls(
+            rate=float(conf.get("rate", cls.rate)),
+            burst=float(conf.get("burst", cls.burst)),
+            spread=float(conf.get("spread", cls.spread)),
+            hosts=dict(conf.get("hosts") or {}),
+        )
+
+
+class HostRateLimiter:
+    """Keeps one token bucket per upstream host."""
+
+    def __init__(self, settings: RateLimitSettings = None):
+        self.settings = settings or RateLimitSettings()
+        self._buckets = {}
+
+    def bucket(self, host: str):
+        if host not in self._buckets:
+            conf = self.settings.hosts.get(host) or {}
+            rate = float(conf.get("rate", self.settings.rate))
+            burst = float(conf.get("burst", self.settings.burst))
+            self._buckets[host] = TokenBucket(rate, burst) if rate > 0 else None
+        return self._buckets[host]
+
+    async def acquire(self, host: str):
+        bucket = self.bucket(host)
+        if bucket is not None:
+            await bucket.acquire()
+
+
+class DispatchSchedule:
+    """
+    Jittered start times for ``count`` accounts within ``window`` seconds of
+    the run start. Other accounts keep running while one waits for its slot,
+    so the spread replaces an up-front sleep without idling the run. With
+    ``count=None`` (streamed accounts) every account draws its own offset.
+    """
+
+    def __init__(self, count, window: float):
+        self.started = time.monotonic()
+        self.window = max(0.0, window) if count is None or count else 0.0
+        self.offsets = (
+            None
+            if count is None
+            else sorted(random.uniform(0, self.window) for _ in range(count))
+        )
+
+    async def wait(self, position: int):
+        """Waits for the start slot of the account at ``position`` (0-based)."""
+        if self.offsets is None:
+            offset = random.uniform(0, self.window)
+        elif position < len(self.offsets):
+            offset = self.offsets[position]
+        else:
+            return
+        delay = offset - (time.monotonic() - self.started)
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,188 @@
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from dataclasses import dataclass
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(httpx.RequestError):
+    """Raised instead of sending a request while the host's breaker is open."""
+
+
+@dataclass
+class ResilienceSettings:
+    """Retry and circuit-breaker settings (``resilience`` section of the config)."""
+
+    retries: int = 2  # extra attempts for idempotent GETs
+    backoff: float = 0.5  # base delay, doubled on every retry
+    max_backoff: float = 10.0  # also caps how long a Retry-After is honoured
+    failure_threshold: int = 5  # consecutive failures that open a host's breaker
+    cooldown: float = 30.0  # seconds before an open breaker lets a probe through
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        return cls(
+            retries=max(0, int(conf.get("retries", cls.retries))),
+            backoff=float(conf.get("backoff", cls.backoff)),
+            max_backoff=float(conf.get("max_backoff", cls.max_backoff)),
+            failure_threshold=max(1, int(conf.get("failure_threshold", cls.failure_threshold))),
+            cooldown=float(conf.get("cooldown", cls.cooldown)),
+        )
+
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def _retry_after(response: httpx.Response):
+    """Parses a Retry-After header (seconds or HTTP date) into seconds."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Per-host breaker. ``failure_threshold`` consecutive failures open it and
+    requests fail fast; after ``cooldown`` a single probe is let through
+    (half-open), which closes the breaker on success or re-opens it on failure.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, host: str, failure_threshold: int, cooldown: float):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self.retry_in() == 0:
+            self.state = self.HALF_OPEN
+            logger.info("%s 熔断冷却结束，发送探测请求", self.host)
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("%s 已恢复，熔断关闭", self.host)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def release(self):
+        """
+        Called when an allowed request ended without an outcome (cancelled, or
+        an unexpected error). A half-open probe counts as failed, so the slot
+        is not held forever; a closed breaker is left alone.
+        """
+        if self._probing:
+            self.record_failure()
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self.failures >= self.failure_threshold
+        ):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            logger.warning(
+                "%s 连续失败 %s 次，熔断 %g 秒", self.host, self.failures, self.cooldown
+            )
+
+
+class Resilience:
+    """Bounded retries with backoff plus a circuit breaker per host, for idempotent requests."""
+
+    def __init__(self, settings: ResilienceSettings = None):
+        self.settings = settings or ResilienceSettings()
+        self._breakers = {}
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(
+                host, self.settings.failure_threshold, self.settings.cooldown
+            )
+        return self._breakers[host]
+
+    def _delay(self, attempt: int, response: httpx.Response = None) -> float:
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.settings.max_backoff)
+        ceiling = min(self.settings.max_backoff, self.settings.backoff * 2 ** (attempt - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    async def call(self, host: str, send) -> httpx.Response:
+        """
+        Awaits ``send()`` until it returns a non-retryable response or attempts
+        run out. Transport errors and 429/5xx count as failures for the breaker.
+        The last response (or error) is passed through unchanged.
+        """
+        breaker = self.breaker(host)
+        attempt = 0
+        while True:
+            attempt += 1
+            if not breaker.allow():
+                raise CircuitOpenError(
+                    f"{host} 不可用，已熔断（{breaker.retry_in():.0f} 秒后重试）"
+                )
+            try:
+                response = await send()
+            except httpx.RequestError as e:
+                breaker.record_failure()
+                if attempt > self.settings.retries:
+                    raise
+                delay = self._delay(attempt)
+                logger.warning(
+                    "请求 %s 失败: %s，%.1f 秒后重试 (%s/%s)", host, e, delay, attempt, self.settings.retries
+                )
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                # 429 means the host is alive but throttling us
+                breaker.record_success()
+            if attempt > self.settings.retries:
+                return response
+            delay = self._delay(attempt, response)
+            logger.warning(
+                "请求 %s 返回 %s，%.1f 秒后重试 (%s/%s)",
+                host,
+                response.status_code,
+                delay,
+                attempt,
+                self.settings.retries,
+            )
+            await asyncio.sleep(delay)
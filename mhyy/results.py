@@ -0,0 +1,62 @@
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+from .state import SHANGHAI
+
+logger = logging.getLogger(__name__)
+
+
+def result_record(result) -> dict:
+    """The JSON Lines record of an AccountResult."""
+    return {
+        "index": result.index,
+        "fingerprint": result.fingerprint,
+        "region": result.region,
+        "bbsid": result.bbsid,
+        "sign_in": result.sign_in,
+        "confirmed": result.confirmed,
+        "wallet": result.wallet,
+        "latencies": result.latencies,
+        "elapsed": round(result.elapsed, 4),
+        "errors": result.errors,
+        "finished_at": datetime.fromtimestamp(time.time(), SHANGHAI).isoformat(timespec="seconds"),
+    }
+
+
+class ResultWriter:
+    """
+    Streams one JSON object per account to ``path`` (appended) or to stdout
+    for ``"-"``. Every line is flushed as soon as the account finishes, so
+    nothing accumulates in memory and a reader can tail the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path == "-":
+            self._file = sys.stdout
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, result):
+        try:
+            self._file.write(json.dumps(result_record(result), ensure_ascii=False) + "\n")
+            self._file.flush()
+        except OSError as e:
+            logger.warning(f"写入第 {result.index} 个账号的结果记录失败: {e}")
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,445 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from collections.abc import Sized
+from dataclasses import dataclass, field
+
+import httpx
+
+from .clients import ClientRegistry
+from .logs import account_logs
+from .metrics import Metrics
+from .profiles import InvalidAccount
+from .ratelimit import DispatchSchedule, HostRateLimiter, RateLimitSettings
+from .resilience import Resilience
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_HEADER = "【MHYY】签到状态推送\n\n"
+ACCOUNT_SEPARATOR = "\n---\n\n"
+
+# Sign-in classification of an AccountResult
+SIGN_IN_CLAIMED = "claimed"  # daily login reward found
+SIGN_IN_CAPPED = "capped"  # reward found, free time already at the cap
+SIGN_IN_ALREADY = "already"  # notification list empty, signed in earlier
+SIGN_IN_UNKNOWN = "unknown"  # some other notification
+SIGN_IN_EXPIRED = "expired"  # retcode -100, the token needs a new login
+SIGN_IN_ERROR = "error"  # the check failed
+SIGN_IN_INVALID = "invalid"  # bad config entry, nothing was requested
+
+# Classifications that settle an account for the day
+CONFIRMED_SIGN_INS = frozenset({SIGN_IN_CLAIMED, SIGN_IN_CAPPED, SIGN_IN_ALREADY})
+
+
+@dataclass
+class RunnerLimits:
+    """Concurrency limits for a run (``runner`` section of the config)."""
+
+    concurrency: int = 8  # accounts processed at the same time
+    per_host: int = 4  # in-flight requests per upstream host
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        return cls(
+            concurrency=max(1, int(conf.get("concurrency", cls.concurrency))),
+            per_host=max(1, int(conf.get("per_host", cls.per_host))),
+        )
+
+
+@dataclass
+class AccountResult:
+    """Outcome of a single account, handed to the ``on_result`` callback."""
+
+    index: int  # 1-based position in the account list
+    message: str  # notification text, identical to the per-account push
+    body: str = ""  # the account's own lines, without header or separator (digest mode)
+    sign_in: str = SIGN_IN_ERROR  # one of the SIGN_IN_* classifications
+    wallet: dict = None  # {free_time, play_card, coin_num} when the wallet was read
+    fingerprint: str = None  # AccountProfile.fingerprint, None for invalid entries
+    elapsed: float = 0.0  # seconds spent in check_account
+    region: str = None
+    bbsid: str = None
+    latencies: dict = field(default_factory=dict)  # call name -> seconds, retries included
+    errors: list = field(default_factory=list)  # error lines, as in the message
+
+    @property
+    def confirmed(self) -> bool:
+        return self.sign_in in CONFIRMED_SIGN_INS
+
+
+def _number(value):
+    """The API sends numbers as strings; keeps anything unparsable as it is."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _iter_with_last(items):
+    """Yields (item, is_last) with a one-item lookahead."""
+    iterator = iter(items)
+    try:
+        current = next(iterator)
+    except StopIteration:
+        return
+    for upcoming in iterator:
+        yield current, False
+        current = upcoming
+    yield current, True
+
+
+@dataclass
+class RunContext:
+    """Per-run state shared by every check_account call."""
+
+    registry: ClientRegistry
+    version: str
+    host_slots: dict  # host -> Semaphore(per_host)
+    limiter: HostRateLimiter
+    resilience: Resilience
+    metrics: Metrics
+
+    async def get(self, endpoints, name: str, headers: dict) -> httpx.Response:
+        """
+        GET endpoint ``name`` ("wallet", "announcement" or "notification") of
+        ``endpoints`` through its pooled client: paced and bounded per host,
+        retried with backoff and short-circuited while the host is down.
+        Every attempt is timed into ``metrics``.
+        """
+        client = self.registry.get(endpoints.client)
+        url = getattr(endpoints, name)
+
+        async def send():
+            await self.limiter.acquire(endpoints.host)
+            async with self.host_slots[endpoints.host]:
+                started = time.monotonic()
+                try:
+                    response = await client.get(url, headers=headers)
+                except httpx.RequestError:
+                    self.metrics.request(name, endpoints.client, "error", time.monotonic() - started)
+                    raise
+                self.metrics.request(
+                    name, endpoints.client, response.status_code, time.monotonic() - started
+                )
+                return response
+
+        return await self.resilience.call(endpoints.host, send)
+
+
+async def check_account(ctx: RunContext, profile, is_last: bool = False) -> AccountResult:
+    """
+    Runs the wallet / sign-in checks for one compiled account (AccountProfile
+    or InvalidAccount) and builds its message.
+    """
+    index = profile.index
+    notification_msg = MESSAGE_HEADER  # Message container for the current account
+
+    # Validate account config entry
+    if isinstance(profile, InvalidAccount):
+        logger.error(profile.error)
+        if profile.reason == "missing_key":
+            notification_msg += f"❌ 账号配置错误: {profile.error}\n"
+        else:
+            notification_msg += profile.error + "\n"
+        return AccountResult(
+            index,
+            notification_msg,
+            notification_msg[len(MESSAGE_HEADER) :],
+            SIGN_IN_INVALID,
+            errors=[profile.error],
+        )
+
+    endpoints = profile.endpoints
+    sign_in = SIGN_IN_ERROR
+    wallet = None
+    expired = False
+    tasks = ()
+    latencies = {}
+    errors = []
+
+    async def timed_get(name: str, headers: dict):
+        started = time.monotonic()
+        try:
+            return await ctx.get(endpoints, name, headers)
+        finally:
+            latencies[name] = round(time.monotonic() - started, 4)
+
+    try:
+        headers = profile.headers_for(ctx.version)
+        bbsid = profile.bbsid
+
+        logger.info("--- 正在进行第 %s 个账号 (BBSID: %s)，服务器为%s ---", index, bbsid, endpoints.label)
+        notification_msg += f"☁️ 云原神签到结果 ({endpoints.label}):\n"
+        notification_msg += f"账号 {index} (BBSID: {bbsid})\n\n"
+
+        # The three calls are independent, so issue them together; the wallet
+        # answer decides whether the other two are still needed
+        tasks = [
+            asyncio.create_task(timed_get(name, headers))
+            for name in ("wallet", "announcement", "notification")
+        ]
+        wallet_task, announcement_task, notification_task = tasks
+
+        try:
+            wallet_res = await wallet_task
+            wallet_res.raise_for_status()
+            wallet_data = wallet_res.json()
+            logger.debug("Wallet response: %s", wallet_data)
+            ctx.metrics.retcode("wallet", wallet_data.get("retcode"))
+
+            if wallet_data.get("retcode") == -100:
+                error_msg = f"当前登录已过期，请重新登陆！返回为：{wallet_data.get('message', 'Unknown error')}"
+                logger.error(error_msg)
+                errors.append(error_msg)
+                notification_msg += error_msg + "\n"
+                expired = True
+            elif wallet_data.get("retcode") == 0 and wallet_data.get("data"):
+                free_time = wallet_data["data"]["free_time"]["free_time"]
+                play_card_msg = wallet_data["data"]["play_card"]["short_msg"]
+                coin_num = wallet_data["data"]["coin"]["coin_num"]
+                coin_minutes = int(coin_num) / 10 if coin_num is not None else 0
+                wallet_status = f"✅ 钱包：免费时长 {free_time} 分钟，畅玩卡状态为「{play_card_msg}」，拥有原点 {coin_num} 点 ({coin_minutes:.0f}分钟)\n"
+                logger.info(wallet_status.strip())
+                notification_msg += wallet_status
+                wallet = {
+                    "free_time": _number(free_time),
+                    "play_card": play_card_msg,
+                    "coin_num": _number(coin_num),
+                }
+            else:
+                error_msg = f"获取钱包信息失败: {wallet_data.get('retcode')} - {wallet_data.get('message', 'Unknown error')}"
+                logger.error(error_msg)
+                errors.append(error_msg)
+                notification_msg += error_msg + "\n"
+
+        except httpx.HTTPStatusError as e:
+            error_msg = f"获取钱包信息HTTP错误: {e.response.status_code} - {e.response.text}"
+            logger.error(error_msg)
+            errors.append(error_msg)
+            notification_msg += error_msg + "\n"
+        except httpx.RequestError as e:
+            error_msg = f"请求钱包信息失败: {e}"
+            logger.error(error_msg)
+            errors.append(error_msg)
+            notification_msg += error_msg + "\n"
+        except Exception as e:
+            error_msg = f"解析钱包信息出错: {e}"
+            logger.error(error_msg)
+            errors.append(error_msg)
+            notification_msg += error_msg + "\n"
+
+        if expired:
+            # An expired login fails every other call too, so stop them right away
+            for task in (announcement_task, notification_task):
+                task.cancel()
+            await asyncio.gather(announcement_task, notification_task, return_exceptions=True)
+        else:
+            # --- Check Sign-in Status ---
+            try:
+                announcement_res = await announcement_task
+                announcement_res.raise_for_status()
+                # logger.debug("Announcement response: %s", announcement_res.text) # Too verbose usually
+
+                notification_res = await notification_task
+                notification_res.raise_for_status()
+                notification_data = notification_res.json()
+                logger.debug("Notification response: %s", notification_data)
+                ctx.metrics.retcode("notification", notification_data.get("retcode"))
+
+                sign_in_status = "❓ 未知签到状态"  # Default status
+
+                if notification_data.get("retcode") == 0 and notification_data.get("data"):
+                    notification_list = notification_data["data"].get("list", [])
+
+                    if not notification_list:
+                        sign_in_status = "✅ 今天似乎已经签到过了！(通知列表为空)"
+                        logger.info(sign_in_status)
+                        notification_msg += sign_in_status + "\n"
+                        sign_in = SIGN_IN_ALREADY
+                    else:
+                        # Look for a notification indicating sign-in reward or limit reached
+                        # The logic here was a bit fragile, let's try to be more robust
+                        # Look for specific message patterns if possible, or just check the presence of notifications
+
+                        last_notification_msg = notification_list[0].get("msg")
+                        if len(notification_list) > 0:
+                            last_notification_msg = notification_list[-1].get("msg")
+
+                        try:
+                            # Attempt to parse the 'msg' field which is often a JSON string itself
+                            msg_payload = json.loads(last_notification_msg)
+                            logger.debug("Parsed last notification msg payload: %s", msg_payload)
+
+                            if msg_payload.get("msg") == "每日登录奖励" or msg_payload.get("msg") == "每日登陆奖励":
+                                # This indicates a successful sign-in
+                                sign_in_status = f"✅ 获取签到情况成功！{msg_payload.get('msg')}：获得 {msg_payload.get('num')} 分钟"
+                                logger.info(sign_in_status)
+                                notification_msg += sign_in_status + "\n"
+                                sign_in = SIGN_IN_CLAIMED
+                            elif msg_payload.get("over_num", 0) > 0:
+                                sign_in_status = f"✅ 获取签到情况成功！免费时长已达上限，只能获得 {msg_payload.get('num')} 分钟 (超出 {msg_payload.get('over_num')} 分钟)"
+                                logger.info(sign_in_status)
+                                notification_msg += sign_in_status + "\n"
+                                sign_in = SIGN_IN_CAPPED
+                            else:
+                                sign_in_status = f"❓ 获取到其他通知，可能已经签到或状态未知: {last_notification_msg}"
+                                logger.info(sign_in_status)
+                                notification_msg += sign_in_status + "\n"
+                                sign_in = SIGN_IN_UNKNOWN
+
+                        except json.JSONDecodeError:
+                            # 'msg' is not a JSON string
+                            sign_in_status = f"❓ 获取到非标准通知，可能已经签到或状态未知: {last_notification_msg}"
+                            logger.info(sign_in_status)
+                            notification_msg += sign_in_status + "\n"
+                            sign_in = SIGN_IN_UNKNOWN
+                        except Exception as e:
+                            # Other errors during parsing msg
+                            sign_in_status = f"❌ 解析通知详情时出错: {e}. Raw msg: {last_notification_msg}"
+                            logger.error(sign_in_status)
+                            errors.append(sign_in_status)
+                            notification_msg += sign_in_status + "\n"
+
+                elif notification_data.get("retcode") != 0:
+                    error_msg = f"获取通知列表失败: {notification_data.get('retcode')} - {notification_data.get('message', 'Unknown error')}"
+                    logger.error(error_msg)
+                    errors.append(error_msg)
+                    notification_msg += error_msg + "\n"
+
+            except httpx.HTTPStatusError as e:
+                error_msg = f"获取通知列表HTTP错误: {e.response.status_code} - {e.response.text}"
+                logger.error(error_msg)
+                errors.append(error_msg)
+                notification_msg += error_msg + "\n"
+            except httpx.RequestError as e:
+                error_msg = f"请求通知列表失败: {e}"
+                logger.error(error_msg)
+                errors.append(error_msg)
+                notification_msg += error_msg + "\n"
+            except Exception as e:
+                error_msg = f"检查签到状态时出错: {e}"
+                logger.error(error_msg)
+                errors.append(error_msg)
+                notification_msg += error_msg + "\n"
+
+    except Exception as e:
+        # Catch any other unexpected errors during account processing
+        error_msg = f"处理账号时发生未知错误: {e}"
+        logger.error(error_msg)
+        errors.append(error_msg)
+        notification_msg += f"❌ 账号处理错误: {error_msg}\n"
+    finally:
+        # Nothing outlives the account, e.g. when the wallet parsing blew up
+        for task in tasks:
+            task.cancel()
+
+    if expired:
+        # Whatever the notification list says, the login is gone
+        sign_in = SIGN_IN_EXPIRED
+
+    body = notification_msg[len(MESSAGE_HEADER) :]
+    if not is_last:
+        notification_msg += ACCOUNT_SEPARATOR
+
+    return AccountResult(
+        index,
+        notification_msg,
+        body,
+        sign_in,
+        wallet,
+        profile.fingerprint,
+        region=profile.region,
+        bbsid=profile.bbsid,
+        latencies=latencies,
+        errors=errors,
+    )
+
+
+def expired_summary(profiles, since: dict = None) -> str:
+    """
+    Message body listing accounts skipped because their login is known to be
+    expired; ``since`` maps fingerprints to the date it was first seen.
+    """
+    since = since or {}
+    body = f"⚠️ 以下 {len(profiles)} 个账号的登录已过期，已跳过签到，请重新登陆并更新 token：\n\n"
+    for profile in profiles:
+        line = f"账号 {profile.index} (BBSID: {profile.bbsid}，{profile.endpoints.label})"
+        if profile.fingerprint in since:
+            line += f"，自 {since[profile.fingerprint]} 起"
+        body += line + "\n"
+    return body
+
+
+async def run_accounts(
+    profiles,
+    version,
+    on_result,
+    limits: RunnerLimits = None,
+    registry: ClientRegistry = None,
+    rate_limits: RateLimitSettings = None,
+    resilience: Resilience = None,
+    metrics: Metrics = None,
+    on_first_request=None,
+):
+    """
+    Processes compiled account ``profiles`` (a list or any iterable, consumed
+    lazily) concurrently and awaits ``on_result(AccountResult)`` as each account finishes. Returns the number of processed accounts.
+    ``version`` is the tag or a future of it, awaited only once the first
+    account is due, so the lookup overlaps the start spread; ``on_first_request()``
+    is called just before the first account sends its requests.
+    Requests go through the pooled clients of ``registry``; a private registry
+    is created (and closed) when none is given. Requests are paced per host by
+    ``rate_limits``, and account starts are spread over its ``spread`` window
+    (each streamed account draws its own offset). ``resilience`` (retries and
+    per-host circuit breakers) may be shared between runs, as may ``metrics``.
+    """
+    limits = limits or RunnerLimits()
+    rate_limits = rate_limits or RateLimitSettings()
+    items = _iter_with_last(profiles)
+    schedule = DispatchSchedule(
+        len(profiles) if isinstance(profiles, Sized) else None, rate_limits.spread
+    )
+    processed = 0
+    started = 0
+    pending_version = None if isinstance(version, str) else version
+
+    owns_registry = registry is None
+    registry = registry or ClientRegistry()
+    ctx = RunContext(
+        registry,
+        None if pending_version is not None else version,
+        defaultdict(lambda: asyncio.Semaphore(limits.per_host)),
+        HostRateLimiter(rate_limits),
+        resilience or Resilience(),
+        metrics or Metrics(),
+    )
+
+    async def worker():
+        nonlocal processed, started, on_first_request
+        # Workers share one iterator, so at most `concurrency` accounts are in flight
+        for profile, is_last in items:
+            position, started = started, started + 1
+            await schedule.wait(position)
+            if ctx.version is None:
+                ctx.version = await pending_version
+            if on_first_request is not None:
+                on_first, on_first_request = on_first_request, None
+                on_first()
+            account_started = time.monotonic()
+            with account_logs(profile.index):
+                result = await check_account(ctx, profile, is_last)
+            result.elapsed = time.monotonic() - account_started
+            ctx.metrics.account(result.sign_in, result.elapsed)
+            processed += 1
+            await on_result(result)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(limits.concurrency)))
+    finally:
+        if owns_registry:
+            await registry.aclose()
+
+    return processed
@@ -0,0 +1,42 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+SENTRY_DSN = "https://425d7b4536f94c9fa540fe34dd6609a2@o361988.ingest.sentry.io/6352584"
+
+_initialised = False
+
+
+def init_sentry(traces_sample_rate: float = None):
+    """
+    Initialises Sentry once per process, importing sentry_sdk only here.
+
+    ``MHYY_SENTRY=off`` disables it. Tracing is sampled with
+    ``traces_sample_rate`` or ``MHYY_SENTRY_TRACES_SAMPLE_RATE`` (default 0,
+    i.e. only errors are reported).
+    """
+    global _initialised
+    if _initialised:
+        return
+    _initialised = True
+
+    if os.environ.get("MHYY_SENTRY", "").lower() in ("0", "off", "false", "no"):
+        logger.debug("Sentry disabled by MHYY_SENTRY.")
+        return
+
+    if traces_sample_rate is None:
+        try:
+            traces_sample_rate = float(
+                os.environ.get("MHYY_SENTRY_TRACES_SAMPLE_RATE", 0)
+            )
+        except ValueError:
+            traces_sample_rate = 0.0
+
+    try:
+        import sentry_sdk
+    except ImportError:
+        logger.debug("sentry_sdk not installed, error reporting disabled.")
+        return
+
+    sentry_sdk.init(SENTRY_DSN, traces_sample_rate=traces_sample_rate)
@@ -0,0 +1,74 @@
+import glob
+import hashlib
+import logging
+import time
+
+from .cache import read_json, write_json
+from .profiles import InvalidAccount
+
+logger = logging.getLogger(__name__)
+
+
+def parse_shard(spec: str):
+    """Parses ``"3/8"`` into ``(3, 8)``; shards are numbered from 1."""
+    try:
+        index, count = (int(part) for part in str(spec).split("/", 1))
+    except ValueError:
+        raise ValueError(f"无效的分片参数 {spec!r}，格式应为 序号/总数，例如 3/8")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"无效的分片参数 {spec!r}，序号应在 1 到 {count} 之间")
+    return index, count
+
+
+def account_key(profile) -> str:
+    """Stable identity of an account: its device id, or its token when missing."""
+    if isinstance(profile, InvalidAccount):
+        return f"invalid:{profile.config!r}"
+    return profile.deviceid or profile.token
+
+
+def shard_of(key: str, count: int) -> int:
+    """
+    Rendezvous (highest random weight) hashing: every shard scores the key and
+    the highest score wins. Going from N to N+1 shards only moves the ~1/(N+1)
+    accounts the new shard wins; nothing moves between existing shards.
+    """
+    return max(
+        range(1, count + 1),
+        key=lambda shard: hashlib.sha256(f"{shard}:{key}".encode()).digest(),
+    )
+
+
+def select_shard(profiles, index: int, count: int):
+    """Yields the profiles that belong to shard ``index`` of ``count``."""
+    for profile in profiles:
+        if shard_of(account_key(profile), count) == index:
+            yield profile
+
+
+def write_shard_results(path: str, shard: str, blocks: list):
+    """Writes one shard's ``(index, body)`` blocks for a later merge."""
+    write_json(
+        path,
+        {
+            "shard": shard,
+            "finished_at": time.time(),
+            "accounts": [{"index": index, "body": body} for index, body in blocks],
+        },
+    )
+
+
+def merge_shard_results(patterns) -> list:
+    """Reads shard result files (paths or globs) and returns bodies in account order."""
+    blocks = {}
+    for pattern in patterns:
+        paths = sorted(glob.glob(pattern)) or [pattern]
+        for path in paths:
+            data = read_json(path)
+            if not isinstance(data, dict):
+                logger.error(f"无法读取分片结果文件: {path}")
+                continue
+            logger.info(f"读取分片 {data.get('shard')} 的结果: {path}")
+            for account in data.get("accounts", []):
+                blocks[account["index"]] = account["body"]
+    return [blocks[index] for index in sorted(blocks)]
@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import sqlite3
+from dataclasses import dataclass
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# libyaml's loader is several times faster; the pure-Python one is the fallback
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+ACCOUNT_FILE_SUFFIXES = (".yml", ".yaml", ".json")
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+def _entries(document):
+    """
+    A document holds one account (mapping), a list of them or an ``accounts``
+    list; anything else is passed on for compile_account to reject.
+    """
+    if document is None:
+        return
+    if isinstance(document, list):
+        yield from document
+    elif isinstance(document, dict) and isinstance(document.get("accounts"), list):
+        yield from document["accounts"]
+    else:
+        yield document
+
+
+def iter_directory(path: str):
+    """
+    Yields the accounts of every ``*.yml`` / ``*.yaml`` / ``*.json`` file in
+    ``path``, in file-name order. Only one file is parsed at a time.
+    """
+    with os.scandir(path) as entries:
+        names = sorted(
+            entry.name
+            for entry in entries
+            if entry.is_file() and entry.name.lower().endswith(ACCOUNT_FILE_SUFFIXES)
+        )
+    for name in names:
+        file_path = os.path.join(path, name)
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                if name.lower().endswith(".json"):
+                    document = json.load(f)
+                else:
+                    document = yaml.load(f, Loader=SafeLoader)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            logger.error(f"无法读取账号文件 {file_path}: {e}")
+            continue
+        yield from _entries(document)
+
+
+def iter_yaml_stream(path: str):
+    """Yields the accounts of a multi-document YAML file (``---`` separated), one document at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            for document in yaml.load_all(f, Loader=SafeLoader):
+                yield from _entries(document)
+        except yaml.YAMLError as e:
+            logger.error(f"解析账号文件 {path} 出错，之后的账号已忽略: {e}")
+
+
+def iter_sqlite(path: str, table: str = "accounts"):
+    """
+    Yields the rows of ``table`` as account mappings (column name -> value,
+    NULL columns left out), in rowid order, fetched in batches.
+    """
+    if not table.replace("_", "").isalnum():
+        raise ValueError(f"无效的表名 {table!r}")
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(f'SELECT * FROM "{table}" ORDER BY rowid')
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for row in rows:
+                yield {key: value for key, value in zip(columns, row) if value is not None}
+    finally:
+        conn.close()
+
+
+@dataclass
+class AccountSource:
+    """Where accounts are read from besides the config's ``accounts`` list (``account_source`` section)."""
+
+    type: str  # "directory", "yaml" or "sqlite"
+    path: str
+    table: str = "accounts"  # sqlite only
+
+    @classmethod
+    def from_path(cls, path: str, table: str = "accounts"):
+        """Infers the type: a directory, a SQLite database by suffix, otherwise a YAML stream."""
+        if os.path.isdir(path):
+            return cls("directory", path, table)
+        if path.lower().endswith(SQLITE_SUFFIXES):
+            return cls("sqlite", path, table)
+        return cls("yaml", path, table)
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        if not conf.get("path"):
+            return None
+        table = conf.get("table") or "accounts"
+        if conf.get("type"):
+            return cls(conf["type"], conf["path"], table)
+        return cls.from_path(conf["path"], table)
+
+    def __iter__(self):
+        if self.type == "directory":
+            return iter_directory(self.path)
+        if self.type == "yaml":
+            return iter_yaml_stream(self.path)
+        if self.type == "sqlite":
+            return iter_sqlite(self.path, self.table)
+        raise ValueError(f"未知的账号来源类型 {self.type!r}，可选 directory / yaml / sqlite")
+
+    def __str__(self):
+        return f"{self.type}:{self.path}"
@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+
+from .cache import cache_path
+from .runner import SIGN_IN_EXPIRED
+
+logger = logging.getLogger(__name__)
+
+# Sign-in rewards reset on the Asia/Shanghai day; the zone has no DST, so a fixed offset is exact
+SHANGHAI = timezone(timedelta(hours=8), "Asia/Shanghai")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    fingerprint TEXT PRIMARY KEY,
+    sign_in TEXT NOT NULL,     -- last classification, see mhyy.runner.SIGN_IN_*
+    wallet TEXT,               -- last wallet snapshot as JSON
+    updated_at REAL NOT NULL,  -- unix time of the last result
+    confirmed_day TEXT         -- Shanghai date of the last confirmed sign-in
+);
+CREATE TABLE IF NOT EXISTS expired (
+    fingerprint TEXT PRIMARY KEY,  -- changes with the token, which ends the entry
+    since REAL NOT NULL,           -- unix time retcode -100 was first seen
+    reminded_day TEXT              -- Shanghai date of the last summary notification
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def shanghai_day(timestamp: float = None) -> str:
+    """The Asia/Shanghai calendar date of ``timestamp`` (default now) as YYYY-MM-DD."""
+    if timestamp is None:
+        timestamp = time.time()
+    return datetime.fromtimestamp(timestamp, SHANGHAI).date().isoformat()
+
+
+@dataclass
+class StateSettings:
+    """Run-state store settings (``state`` section of the config)."""
+
+    enabled: bool = True
+    path: str = None  # defaults to <cache dir>/state.db
+    incremental: bool = False  # skip accounts already confirmed today
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        return cls(
+            enabled=bool(conf.get("enabled", cls.enabled)),
+            path=conf.get("path") or cache_path("state.db"),
+            incremental=bool(conf.get("incremental", cls.incremental)),
+        )
+
+
+class StateStore:
+    """
+    Per-account run state in SQLite, keyed by AccountProfile.fingerprint.
+
+    Every result overwrites the last outcome and timestamp; the wallet
+    snapshot is only replaced when the wallet was read, and the confirmed day
+    only moves forward on a confirmed sign-in, so a failed re-check later in
+    the day does not undo an earlier confirmation.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def confirmed(self, day: str = None) -> set:
+        """Fingerprints with a confirmed sign-in on ``day`` (default today)."""
+        rows = self._conn.execute(
+            "SELECT fingerprint FROM accounts WHERE confirmed_day = ?",
+            (day or shanghai_day(),),
+        )
+        return {fingerprint for (fingerprint,) in rows}
+
+    def expired(self) -> dict:
+        """Negative cache of logins known to be expired: fingerprint -> unix time first seen."""
+        return dict(self._conn.execute("SELECT fingerprint, since FROM expired"))
+
+    def due_reminders(self, fingerprints, day: str = None) -> set:
+        """
+        Of the expired ``fingerprints``, returns those not yet reminded about on
+        ``day`` (default today) and marks them as reminded.
+        """
+        day = day or shanghai_day()
+        due = set()
+        try:
+            with self._conn:
+                for fingerprint in fingerprints:
+                    updated = self._conn.execute(
+                        "UPDATE expired SET reminded_day = ? WHERE fingerprint = ? "
+                        "AND reminded_day IS NOT ?",
+                        (day, fingerprint, day),
+                    )
+                    if updated.rowcount:
+                        due.add(fingerprint)
+        except sqlite3.Error as e:
+            logger.warning(f"更新登录过期提醒状态失败: {e}")
+        return due
+
+    def full_summary_due(self, every: int, day: str = None) -> bool:
+        """
+        Whether a run on ``day`` (default today) should push every account
+        because the last full summary is ``every`` days old or older; if so the
+        day is recorded as the new last full summary.
+        """
+        if every <= 0:
+            return False
+        day = day or shanghai_day()
+        try:
+            with self._conn:
+                row = self._conn.execute(
+                    "SELECT value FROM meta WHERE key = 'full_summary_day'"
+                ).fetchone()
+                if row and (date.fromisoformat(day) - date.fromisoformat(row[0])).days < every:
+                    return False
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('full_summary_day', ?)",
+                    (day,),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"读取完整汇总推送记录失败: {e}")
+            return True
+        return True
+
+    def get(self, fingerprint: str):
+        """The stored state of one account as a dict, or None."""
+        row = self._conn.execute(
+            "SELECT sign_in, wallet, updated_at, confirmed_day FROM accounts WHERE fingerprint = ?",
+            (fingerprint,),
+        ).fetchone()
+        if row is None:
+            return None
+        sign_in, wallet, updated_at, confirmed_day = row
+        return {
+            "sign_in": sign_in,
+            "wallet": json.loads(wallet) if wallet else None,
+            "updated_at": updated_at,
+            "confirmed_day": confirmed_day,
+        }
+
+    def record(self, result, timestamp: float = None):
+        """Stores an AccountResult; results without a fingerprint (invalid entries) are ignored."""
+        if not result.fingerprint:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        try:
+            self._write(result, timestamp)
+        except sqlite3.Error as e:
+            # Losing one state row only costs a re-check on the next incremental run
+            logger.warning(f"写入第 {result.index} 个账号的运行状态失败: {e}")
+
+    def _write(self, result, timestamp: float):
+        with self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO accounts (fingerprint, sign_in, wallet, updated_at, confirmed_day)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (fingerprint) DO UPDATE SET
+                    sign_in = excluded.sign_in,
+                    wallet = COALESCE(excluded.wallet, accounts.wallet),
+                    updated_at = excluded.updated_at,
+                    confirmed_day = COALESCE(excluded.confirmed_day, accounts.confirmed_day)
+                """,
+                (
+                    result.fingerprint,
+                    result.sign_in,
+                    json.dumps(result.wallet, ensure_ascii=False) if result.wallet else None,
+                    timestamp,
+                    shanghai_day(timestamp) if result.confirmed else None,
+                ),
+            )
+            if result.sign_in == SIGN_IN_EXPIRED:
+                # The result itself was the reminder for today
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO expired (fingerprint, since, reminded_day) VALUES (?, ?, ?)",
+                    (result.fingerprint, timestamp, shanghai_day(timestamp)),
+                )
+            elif result.wallet is not None or result.confirmed:
+                # Proof the login works again; a mere network error proves nothing
+                self._conn.execute("DELETE FROM expired WHERE fingerprint = ?", (result.fingerprint,))
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_store(settings: StateSettings):
+    """Opens the store described by ``settings``; None when disabled or unusable."""
+    if not settings.enabled:
+        return None
+    try:
+        return StateStore(settings.path)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"无法打开运行状态数据库 {settings.path}: {e}，本次运行不记录状态")
+        return None
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from .cache import cache_path, read_json, write_json
+from .metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+VERSION_URL = "https://hyp-api.mihoyo.com/hyp/hyp-connect/api/getGameBranches?game_ids[]=1Z8W5NHUQb&launcher_id=jGHBHlcOq1"
+DEFAULT_VERSION = "5.0.0"
+
+
+@dataclass
+class VersionCacheSettings:
+    """On-disk version cache settings (``version_cache`` section of the config)."""
+
+    path: str = None  # defaults to <cache dir>/version.json
+    ttl: float = 6 * 3600  # serve from cache without asking the API
+    max_stale: float = 7 * 24 * 3600  # serve stale while refreshing in the background
+    deadline: float = 5.0  # a prefetch slower than this falls back to the cached tag, 0 waits
+
+    @classmethod
+    def from_config(cls, conf: dict = None):
+        conf = conf or {}
+        return cls(
+            path=conf.get("path") or cache_path("version.json"),
+            ttl=float(conf.get("ttl", cls.ttl)),
+            max_stale=float(conf.get("max_stale", cls.max_stale)),
+            deadline=max(0.0, float(conf.get("deadline", cls.deadline))),
+        )
+
+
+def parse_version(data: dict) -> str:
+    return data["data"]["game_branches"][0]["main"]["tag"]
+
+
+class VersionCache:
+    """
+    Caches the getGameBranches tag on disk.
+
+    A fresh entry is returned without any request. A stale entry (within
+    ``max_stale``) is returned immediately while a conditional request
+    (If-None-Match / If-Modified-Since) revalidates it in the background.
+    Only a missing or expired entry puts the request on the critical path,
+    and a failed request falls back to the last known tag before the
+    hard-coded default.
+    """
+
+    def __init__(self, settings: VersionCacheSettings = None, metrics: Metrics = None):
+        self.settings = settings or VersionCacheSettings.from_config()
+        self.metrics = metrics or Metrics()
+        self._entry = None  # kept in memory so warm processes skip the disk read
+        self._thread = None
+        self._prefetch = None
+
+    def load(self):
+        if self._entry is None:
+            entry = read_json(self.settings.path)
+            if isinstance(entry, dict) and entry.get("tag"):
+                self._entry = entry
+        return self._entry
+
+    def _age(self, entry) -> float:
+        return time.time() - float(entry.get("checked_at", 0))
+
+    def _request_headers(self, entry) -> dict:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _observe(self, started: float, response: httpx.Response = None):
+        status = response.status_code if response is not None else "error"
+        self.metrics.request("version", "hyp", status, time.monotonic() - started)
+
+    def _store(self, entry, response: httpx.Response) -> dict:
+        if response.status_code == 304 and entry:
+            entry = dict(entry, checked_at=time.time())
+            logger.debug("Version cache revalidated (304 Not Modified).")
+        else:
+            response.raise_for_status()
+            entry = {
+                "tag": parse_version(response.json()),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "checked_at": time.time(),
+            }
+        self._entry = entry
+        try:
+            write_json(self.settings.path, entry)
+        except OSError as e:
+            logger.warning("无法写入版本号缓存 %s: %s", self.settings.path, e)
+        return entry
+
+    def _pick(self, entry):
+        """Returns (tag, needs_refresh, blocking)."""
+        if entry is None:
+            return None, True, True
+        age = self._age(entry)
+        if age < self.settings.ttl:
+            return entry["tag"], False, False
+        if age < self.settings.ttl + self.settings.max_stale:
+            return entry["tag"], True, False
+        return entry["tag"], True, True
+
+    def _fallback(self, entry, error) -> str:
+        version = entry["tag"] if entry else DEFAULT_VERSION
+        logger.warning("获取版本号失败，使用%s版本：%s. Error: %s", "缓存" if entry else "默认", version, error)
+        return version
+
+    # --- prefetch from the event loop (main.py), built on the sync API ---
+
+    def prefetch(self, client: httpx.Client) -> asyncio.Future:
+        """
+        Starts resolving the version on a daemon thread (the sync API) so the
+        request overlaps whatever the event loop does in the meantime, and
+        returns a future of the tag. With a cached tag, past ``settings.deadline``
+        seconds the future settles on it instead; the request still finishes
+        in the background and updates the cache. Without one the request is
+        awaited (bounded by the client timeout), as the default tag is stale.
+        """
+        loop = asyncio.get_running_loop()
+        fetched = loop.create_future()
+
+        def settle(version):
+            if not fetched.done():
+                fetched.set_result(version)
+
+        def fetch():
+            version = self.get_sync(client)
+            try:
+                loop.call_soon_threadsafe(settle, version)
+            except RuntimeError:  # the loop is gone, nobody is waiting any more
+                pass
+
+        self._prefetch = threading.Thread(target=fetch, name="mhyy-version", daemon=True)
+        self._prefetch.start()
+        return asyncio.ensure_future(self._hedge(fetched))
+
+    async def _hedge(self, fetched: asyncio.Future) -> str:
+        entry = self.load()
+        if not self.settings.deadline or entry is None:
+            return await fetched
+        try:
+            return await asyncio.wait_for(asyncio.shield(fetched), self.settings.deadline)
+        except asyncio.TimeoutError:
+            return self._fallback(entry, f"{self.settings.deadline:g} 秒内没有响应，请求继续在后台进行")
+
+    async def wait(self):
+        """Waits for a pending background revalidation."""
+        if self._thread is not None:
+            # Revalidation started by a prefetch; a prefetch past its deadline is not waited for
+            await asyncio.get_running_loop().run_in_executor(None, self.wait_sync)
+
+    # --- sync API (scf.py, and the prefetch thread) ---
+
+    def refresh_sync(self, client: httpx.Client, entry=None, timeout=None) -> dict:
+        started = time.monotonic()
+        try:
+            response = client.get(
+                VERSION_URL,
+                headers=self._request_headers(entry),
+                timeout=httpx.USE_CLIENT_DEFAULT if timeout is None else timeout,
+            )
+        except httpx.RequestError:
+            self._observe(started)
+            raise
+        self._observe(started, response)
+        return self._store(entry, response)
+
+    def _refresh_sync_quietly(self, client, entry):
+        try:
+            self.refresh_sync(client, entry)
+        except Exception as e:
+            logger.warning("后台刷新版本号失败: %s", e)
+
+    def get_sync(self, client: httpx.Client, timeout: float = None) -> str:
+        entry = self.load()
+        version, needs_refresh, blocking = self._pick(entry)
+        if blocking:
+            try:
+                version = self.refresh_sync(client, entry, timeout)["tag"]
+                logger.info("从官方API获取到云·原神最新版本号：%s", version)
+            except Exception as e:
+                version = self._fallback(entry, e)
+            return version
+        if needs_refresh and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(
+                target=self._refresh_sync_quietly, args=(client, entry), daemon=True
+            )
+            self._thread.start()
+        logger.info("使用缓存的云·原神版本号：%s", version)
+        return version
+
+    def wait_sync(self, timeout: float = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -1,18 +1,16 @@
-import httpx
+import time
+
+_import_started = time.perf_counter()
+
 import json
 import os
-import re
-import sentry_sdk
-import random
-import time
-import yaml
 import logging
 
-# 配置 Sentry
-sentry_sdk.init(
-    "https://425d7b4536f94c9fa540fe34dd6609a2@o361988.ingest.sentry.io/6352584",
-    traces_sample_rate=1.0,
-)
+from mhyy.deadline import Deadline, DurationEstimate, JitterSchedule, budget_from_context
+from mhyy.profiles import InvalidAccount
+
+# 云函数只有 /tmp 可写，版本号缓存默认放在这里
+os.environ.setdefault("MHYY_CACHE_DIR", "/tmp/mhyy_cache")
 
 # 配置日志级别
 loglevel_env = os.environ.get("MHYY_LOGLEVEL", "INFO").upper()
@@ -40,15 +38,42 @@ accounts:
     region: cn
 """
 
+_import_seconds = time.perf_counter() - _import_started
+
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36 Edg/121.0.0.0"
+
+
 class RunError(Exception):
     pass
 
-def handler(*args):
-    """
-    云函数入口函数。
-    """
-    # 读取配置
-    conf_data = yaml.load(config_datas, Loader=yaml.FullLoader)
+
+class _State:
+    """热容器内跨调用复用的状态：预编译的账户、连接池、版本号缓存。"""
+
+    def __init__(self, accounts, registry, version_cache):
+        self.accounts = accounts
+        self.registry = registry
+        self.version_cache = version_cache
+
+
+_state = None
+
+
+def _init_state():
+    """冷启动时初始化一次；配置有误时返回错误信息，下次调用会重新尝试。"""
+    global _state
+    # 较重的依赖在首次调用时才导入
+    import yaml
+    from mhyy.cassette import cassette_from_env
+    from mhyy.clients import ClientRegistry
+    from mhyy.profiles import compile_accounts
+    from mhyy.sentry import init_sentry
+    from mhyy.version import VersionCache
+
+    init_sentry()
+
+    conf_data = yaml.load(config_datas, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
     if not conf_data or "accounts" not in conf_data:
         logger.error("请正确配置账户信息后再运行本脚本！")
         return {"statusCode": 1, "message": "配置错误，请检查账户信息。"}
@@ -58,6 +83,37 @@ def handler(*args):
         logger.error("账户配置为空！")
         return {"statusCode": 1, "message": "账户配置为空，请添加账户信息。"}
 
+    profiles = compile_accounts(conf, strict=True, user_agent=USER_AGENT)
+    # MHYY_RECORD / MHYY_REPLAY：录制或回放所有请求，便于离线调试和计时
+    _state = _State(profiles, ClientRegistry(cassette=cassette_from_env()), VersionCache())
+    return None
+
+
+def handler(*args):
+    """
+    云函数入口函数。
+    """
+    started = time.perf_counter()
+    # 按本次调用的剩余执行时间安排任务，而不是固定休眠后串行跑完
+    context = args[1] if len(args) > 1 else None
+    deadline = Deadline(budget_from_context(context))
+    warm = _state is not None
+    timing = {"import": round(_import_seconds, 4)}
+
+    if not warm:
+        error = _init_state()
+        timing["init"] = round(time.perf_counter() - started, 4)
+        if error:
+            return dict(error, timing=timing, warm=warm)
+
+    result = _run(_state, timing, deadline)
+    timing["total"] = round(time.perf_counter() - started, 4)
+    return dict(result, timing=timing, warm=warm)
+
+
+def _run(state, timing, deadline):
+    registry = state.registry
+    conf = state.accounts
     logger.info(f"检测到 {len(conf)} 个账号，正在进行任务……")
 
     # 获取 SCT 通知配置
@@ -68,90 +124,53 @@ def handler(*args):
     sct_msg = ""
 
     try:
-        # 随机等待时间以避免被封禁
+        # 可选：设置 MHYY_JITTER_WINDOW（秒）把各账号的开始时间分散到一个随机窗口内，避免同一时间签到人数太多；
+        # 获取版本号和处理账号的耗时都计入窗口，只等待没有被覆盖的部分。
+        # 云函数按运行时长计费，等待的时间同样计费，所以默认不等待；需要错开时间时建议直接错开定时触发器
         debug_mode = os.environ.get("MHYY_DEBUG", "False").upper() == "TRUE"
-        if not debug_mode:
-            wait_time = random.randint(10, 60)
-            logger.info(f"为了避免同一时间签到人数太多导致被官方怀疑，开始休眠 {wait_time} 秒")
-            time.sleep(wait_time)
-
-        # 获取最新版本号
-        try:
-            ver_info = httpx.get(
-                "https://hyp-api.mihoyo.com/hyp/hyp-connect/api/getGameBranches?game_ids[]=1Z8W5NHUQb&launcher_id=jGHBHlcOq1",
-                timeout=60,
-                verify=False,
-            ).text
-            version = json.loads(ver_info)["data"]["game_branches"][0]["main"]["tag"]
-            logger.info(f"从官方API获取到云·原神最新版本号：{version}")
-        except Exception as e:
-            version = "5.0.0"
-            logger.warning(f"获取版本号失败，使用默认版本：{version}")
+        jitter_window = 0 if debug_mode else float(os.environ.get("MHYY_JITTER_WINDOW") or 0)
+        schedule = JitterSchedule(len(conf), jitter_window, deadline)
+        estimate = DurationEstimate()
+        skipped = []
+
+        # 获取最新版本号（优先使用本地缓存）
+        phase_started = time.perf_counter()
+        version_cache = state.version_cache
+        version = version_cache.get_sync(registry.get_sync("hyp"), timeout=deadline.timeout(60))
+        timing["version"] = round(time.perf_counter() - phase_started, 4)
+        phase_started = time.perf_counter()
 
         # 遍历每个账户进行任务
-        for idx, config in enumerate(conf, start=1):
-            if not config:
-                raise RunError("账户配置为空，请添加账户信息。")
-
-            # 提取账户配置
-            token = config.get("token")
-            client_type = config.get("type")
-            sysver = config.get("sysver")
-            deviceid = config.get("deviceid")
-            devicename = config.get("devicename")
-            devicemodel = config.get("devicemodel")
-            appid = config.get("appid")
-            region = config.get("region", "cn")
-
-            if not all([token, client_type, sysver, deviceid, devicename, devicemodel, appid]):
+        account_started = None
+        for idx, profile in enumerate(conf, start=1):
+            if account_started is not None:
+                estimate.update(time.monotonic() - account_started)
+            wait_time = schedule.delay(idx - 1)
+            if not deadline.allows(wait_time + estimate.value):
+                skipped = list(range(idx, len(conf) + 1))
+                logger.warning(f"剩余执行时间不足，跳过第 {idx} - {len(conf)} 个账号")
+                break
+            if wait_time > 0:
+                logger.debug("第 %s 个账号的随机开始时间未到，等待 %.1f 秒", idx, wait_time)
+                time.sleep(wait_time)
+            account_started = time.monotonic()
+
+            if isinstance(profile, InvalidAccount):
+                if not profile.config:
+                    raise RunError("账户配置为空，请添加账户信息。")
                 logger.error(f"第 {idx} 个账户配置不完整，请检查配置。")
                 sct_msg += f"第 {idx} 个账户配置不完整，请检查配置。\n"
                 continue
 
-            # 构建请求头
-            headers = {
-                "x-rpc-combo_token": token,
-                "x-rpc-client_type": str(client_type),
-                "x-rpc-app_version": str(version),
-                "x-rpc-sys_version": str(sysver),
-                "x-rpc-channel": "cyydmihoyo",
-                "x-rpc-device_id": deviceid,
-                "x-rpc-device_name": devicename,
-                "x-rpc-device_model": devicemodel,
-                "x-rpc-vendor_id": "1",
-                "x-rpc-cg_game_biz": "hk4e_cn",
-                "x-rpc-op_biz": "clgm_cn",
-                "x-rpc-language": "zh-cn",
-                "Host": "api-cloudgame.mihoyo.com",
-                "Connection": "Keep-Alive",
-                "Accept-Encoding": "gzip",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36 Edg/121.0.0.0",
-            }
+            endpoints = profile.endpoints
+            headers = profile.headers_for(version)
 
-            # 处理国际服
-            if region == "os":
-                headers.update({
-                    "x-rpc-channel": "mihoyo",
-                    "x-rpc-cg_game_biz": "hk4e_global",
-                    "x-rpc-op_biz": "clgm_global",
-                    "x-rpc-cg_game_id": "9000254",
-                    "x-rpc-app_id": "600493",
-                    "User-Agent": "okhttp/4.10.0",
-                    "Host": "sg-cg-api.hoyoverse.com",
-                })
-                NotificationURL = "https://sg-cg-api.hoyoverse.com/hk4e_global/cg/gamer/api/listNotifications?status=NotificationStatusUnread&type=NotificationTypePopup&is_sort=true"
-                WalletURL = "https://sg-cg-api.hoyoverse.com/hk4e_global/cg/wallet/wallet/get"
-                AnnouncementURL = "https://sg-cg-api.hoyoverse.com/hk4e_global/cg/gamer/api/getAnnouncementInfo"
-            else:
-                NotificationURL = "https://api-cloudgame.mihoyo.com/hk4e_cg_cn/gamer/api/listNotifications?status=NotificationStatusUnread&type=NotificationTypePopup&is_sort=true"
-                WalletURL = "https://api-cloudgame.mihoyo.com/hk4e_cg_cn/wallet/wallet/get"
-                AnnouncementURL = "https://api-cloudgame.mihoyo.com/hk4e_cg_cn/gamer/api/getAnnouncementInfo"
-
-            logger.info(f"正在进行第 {idx} 个账号，服务器为{'GLOBAL' if region == 'os' else 'CN'}……")
+            logger.info(f"正在进行第 {idx} 个账号，服务器为{endpoints.label}……")
+            api = registry.get_sync(endpoints.client)
 
             try:
                 # 获取钱包信息
-                wallet_response = httpx.get(WalletURL, headers=headers, timeout=60, verify=False)
+                wallet_response = api.get(endpoints.wallet, headers=headers, timeout=deadline.timeout(60))
                 wallet_data = wallet_response.json()
                 logger.debug(wallet_data)
 
@@ -176,12 +195,12 @@ def handler(*args):
                     )
 
                 # 获取公告信息
-                announcement_response = httpx.get(AnnouncementURL, headers=headers, timeout=60, verify=False)
+                announcement_response = api.get(endpoints.announcement, headers=headers, timeout=deadline.timeout(60))
                 announcement_data = announcement_response.json()
-                logger.debug(f'获取到公告列表：{announcement_data["data"]}')
+                logger.debug("获取到公告列表：%s", announcement_data["data"])
 
                 # 获取签到通知
-                notification_response = httpx.get(NotificationURL, headers=headers, timeout=60, verify=False)
+                notification_response = api.get(endpoints.notification, headers=headers, timeout=deadline.timeout(60))
                 notification_data = notification_response.json()
                 logger.debug(notification_data)
 
@@ -213,7 +232,7 @@ def handler(*args):
                     if Signed:
                         logger.info(f"账号 {idx}: 获取签到情况成功！今天是否已经签到过了呢？")
                         sct_msg += f"账号 {idx}: 获取签到情况成功！今天是否已经签到过了呢？\n"
-                        logger.debug(f"完整返回体为：{notification_response.text}")
+                        logger.debug("完整返回体为：%s", notification_response.text)
                     elif not Signed and Over:
                         last_msg = json.loads(notifications[-1]["msg"])
                         logger.info(
@@ -232,7 +251,7 @@ def handler(*args):
                 # 发送 SCT 通知
                 if sct_url:
                     try:
-                        sct_response = httpx.get(sct_url, params={"desp": sct_msg}, timeout=30)
+                        sct_response = registry.get_sync("serverchan").get(sct_url, params={"desp": sct_msg})
                         if sct_response.status_code == 200:
                             logger.info("SCT 推送完成！")
                         else:
@@ -245,11 +264,23 @@ def handler(*args):
                 sct_msg += f"账号 {idx} 执行过程中出错：{str(e)}\n"
                 if sct_url:
                     try:
-                        httpx.get(sct_url, params={"desp": sct_msg}, timeout=30)
+                        registry.get_sync("serverchan").get(sct_url, params={"desp": sct_msg})
                     except Exception as notify_error:
                         logger.error(f"SCT 推送时出错：{notify_error}")
                 continue
 
+        version_cache.wait_sync(timeout=5)
+        timing["accounts"] = round(time.perf_counter() - phase_started, 4)
+        if skipped:
+            sct_msg += f"剩余执行时间不足，以下账号未处理：{', '.join(map(str, skipped))}\n"
+            logger.info("执行时间即将用尽，已返回部分结果！")
+            return {
+                "statusCode": 0,
+                "message": "执行时间即将用尽，已返回部分结果！",
+                "details": sct_msg,
+                "partial": True,
+                "skipped": skipped,
+            }
         logger.info("所有任务已经执行完毕！")
         return {"statusCode": 0, "message": "所有任务已经执行完毕！", "details": sct_msg}
 
@@ -257,7 +288,7 @@ def handler(*args):
         logger.error(f"运行错误：{str(re)}")
         if sct_url:
             try:
-                httpx.get(sct_url, params={"desp": f"运行错误：{str(re)}"}, timeout=30)
+                registry.get_sync("serverchan").get(sct_url, params={"desp": f"运行错误：{str(re)}"})
             except Exception as notify_error:
                 logger.error(f"SCT 推送时出错：{notify_error}")
         return {"statusCode": 1, "message": f"运行错误：{str(re)}"}
@@ -266,7 +297,7 @@ def handler(*args):
         logger.error(f"未知错误：{str(e)}")
         if sct_url:
             try:
-                httpx.get(sct_url, params={"desp": f"未知错误：{str(e)}"}, timeout=30)
+                registry.get_sync("serverchan").get(sct_url, params={"desp": f"未知错误：{str(e)}"})
             except Exception as notify_error:
                 logger.error(f"SCT 推送时出错：{notify_error}")
         return {"statusCode": 1, "message": f"未知错误：{str(e)}"}
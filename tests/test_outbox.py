@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+from mhyy.outbox import Outbox, OutboxSettings, QueuedDispatcher
+
+
+class Result:
+    def __init__(self, ok=True, error=None):
+        self.ok = ok
+        self.error = error
+
+
+class Channel:
+    name = "serverchan"
+    label = "Server酱"
+    conf = {}
+    rate = None
+    limit = 1000
+
+
+class SlowDispatcher:
+    """Dispatcher stand-in whose every push takes ``delay`` seconds."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.channels = [Channel()]
+        self.sent = []
+
+    async def deliver(self, channel, message):
+        await asyncio.sleep(self.delay)
+        self.sent.append(message)
+        return Result()
+
+
+def test_close_stops_waiting_at_drain_timeout(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    settings = OutboxSettings(path=path, rate=0, drain_timeout=0.3)
+    dispatcher = SlowDispatcher(delay=0.2)
+
+    async def scenario():
+        with Outbox(path, settings) as outbox:
+            queued = QueuedDispatcher(dispatcher, outbox)
+            queued.start()
+            for index in range(10):
+                await queued.dispatch(f"message {index}")
+            started = time.monotonic()
+            await queued.close()
+            return time.monotonic() - started, outbox.pending()
+
+    elapsed, pending = asyncio.run(scenario())
+    assert elapsed < 1.0
+    # Whatever was not delivered in time is still queued for the next run
+    assert len(dispatcher.sent) < 10
+    assert pending == 10 - len(dispatcher.sent)
+
+
+def test_delivered_message_can_be_queued_again(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    with Outbox(path, OutboxSettings(path=path)) as outbox:
+        first = outbox.enqueue("serverchan", "签到成功")
+        assert first is not None
+        # Still pending: the repeat is folded into it
+        assert outbox.enqueue("serverchan", "签到成功") is None
+        outbox.mark_sent(first)
+        # Delivered: an identical message from a later pass is a new push
+        assert outbox.enqueue("serverchan", "签到成功") is not None
+        assert outbox.pending() == 1
@@ -0,0 +1,72 @@
+import asyncio
+
+import httpx
+import pytest
+
+from mhyy.resilience import CircuitOpenError, Resilience, ResilienceSettings
+
+
+def open_breaker(resilience: Resilience, host: str):
+    breaker = resilience.breaker(host)
+    for _ in range(resilience.settings.failure_threshold):
+        breaker.record_failure()
+    breaker.opened_at -= resilience.settings.cooldown  # cooled down, next call probes
+    return breaker
+
+
+def test_cancelled_probe_releases_half_open_breaker():
+    resilience = Resilience(ResilienceSettings(retries=0, failure_threshold=1, cooldown=30))
+    breaker = open_breaker(resilience, "example.com")
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    async def ok():
+        return httpx.Response(200)
+
+    async def scenario():
+        probe = asyncio.ensure_future(resilience.call("example.com", hang))
+        await asyncio.sleep(0)
+        assert breaker.state == breaker.HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        # The abandoned probe re-opened the breaker instead of jamming it
+        assert breaker.state == breaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await resilience.call("example.com", ok)
+        breaker.opened_at -= resilience.settings.cooldown
+        return await resilience.call("example.com", ok)
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert breaker.state == breaker.CLOSED
+
+
+def test_unexpected_error_in_probe_releases_breaker():
+    resilience = Resilience(ResilienceSettings(retries=0, failure_threshold=1))
+    breaker = open_breaker(resilience, "example.com")
+
+    async def broken():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        asyncio.run(resilience.call("example.com", broken))
+    assert breaker.state == breaker.OPEN
+    assert not breaker._probing
+
+
+def test_cancellation_does_not_count_against_closed_breaker():
+    resilience = Resilience(ResilienceSettings(retries=0, failure_threshold=1))
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    async def scenario():
+        call = asyncio.ensure_future(resilience.call("example.com", hang))
+        await asyncio.sleep(0)
+        call.cancel()
+        await asyncio.gather(call, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert resilience.breaker("example.com").state == "closed"